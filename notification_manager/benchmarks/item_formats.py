@@ -0,0 +1,72 @@
+"""
+Compare get_item_with_qty response formats on a synthetic catalog.
+
+    python -m notification_manager.benchmarks.item_formats --items 100000
+"""
+import argparse
+import json
+import random
+import string
+import time
+
+from notification_manager.notification_manager.serializers import iter_msgpack_chunks, to_columnar
+
+COLUMNS = ["name", "item_code", "item_name", "item_group", "stock_uom", "disabled", "actual_qty"]
+
+
+def make_catalog(count):
+    random.seed(42)
+    groups = ["Products", "Raw Material", "Services", "Sub Assemblies", "Consumable"]
+    uoms = ["Nos", "Kg", "Box", "Litre"]
+    rows = []
+    for i in range(count):
+        code = f"ITEM-{i:07d}"
+        name = "".join(random.choices(string.ascii_letters + " ", k=random.randint(12, 40)))
+        rows.append((
+            code, code, name, random.choice(groups), random.choice(uoms),
+            int(random.random() < 0.05), round(random.uniform(0, 500), 3)
+        ))
+    return rows
+
+
+def measure(encode, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        payload = encode()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(payload)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rows = make_catalog(args.items)
+    dict_rows = [dict(zip(COLUMNS, row, strict=True)) for row in rows]
+
+    formats = {
+        "json rows (current)": lambda: json.dumps(dict_rows).encode(),
+        "json columnar": lambda: json.dumps(to_columnar(COLUMNS, rows)).encode(),
+    }
+    try:
+        import msgpack
+
+        formats["msgpack rows"] = lambda: msgpack.packb(dict_rows)
+        formats["msgpack columnar chunks"] = lambda: b"".join(iter_msgpack_chunks(COLUMNS, rows))
+    except ImportError:
+        print("msgpack not installed, skipping msgpack formats")
+
+    baseline = None
+    print(f"{'format':<26}{'encode ms':>12}{'bytes':>14}{'size':>8}")
+    for label, encode in formats.items():
+        seconds, size = measure(encode, args.repeat)
+        baseline = baseline or size
+        print(f"{label:<26}{seconds * 1000:>12.1f}{size:>14,}{size / baseline:>8.0%}")
+
+
+if __name__ == "__main__":
+    main()
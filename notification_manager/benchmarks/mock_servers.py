@@ -0,0 +1,233 @@
+"""
+Local stand-ins for the PassKit API and the SMS gateway.
+
+Members are kept in memory so list lookups find what was enrolled
+before, which lets the PassKit flows take their "found" branches.
+Latency, error rate and a rate limit can be set to load-test retries,
+the circuit breaker and the points flush.
+
+    python -m notification_manager.benchmarks.mock_servers --port 8700 --latency-ms 80 --error-rate 0.02 --rate-limit 50
+
+then point the site at it:
+
+    bench --site mysite set-config passkit_api_url http://127.0.0.1:8700
+    # SMS Settings > SMS Gateway URL: http://127.0.0.1:8700/sms
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+
+class TokenBucket:
+    """
+    Allow `rate` requests per second with bursts of up to `burst`.
+    """
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class MockState:
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, rate_limit=None, burst=None):
+        self.lock = threading.Lock()
+        self.members = {}
+        self.sms_sent = 0
+        self.requests = 0
+        self.errors = 0
+        self.throttled = 0
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.bucket = TokenBucket(rate_limit, burst) if rate_limit else None
+
+    def find_member(self, filters):
+        for group in filters.get("filterGroups") or []:
+            for field_filter in group.get("fieldFilters") or []:
+                if field_filter.get("filterField") == "mobileNumber":
+                    mobile = field_filter.get("filterValue")
+                    return [m for m in self.members.values() if m["person"].get("mobileNumber") == mobile]
+        return list(self.members.values())
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            return {}
+
+    def send_body(self, status, body=b"", content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status, data):
+        self.send_body(status, json.dumps(data).encode())
+
+    def do_GET(self):
+        self.route("GET")
+
+    def do_POST(self):
+        self.route("POST")
+
+    def do_PUT(self):
+        self.route("PUT")
+
+    def do_DELETE(self):
+        self.route("DELETE")
+
+    def route(self, method):
+        path = urlparse(self.path).path.rstrip("/")
+        payload = self.read_json() if method != "GET" else {}
+        state = self.state
+
+        with state.lock:
+            state.requests += 1
+        if state.latency or state.jitter:
+            time.sleep(max(0.0, state.latency + random.uniform(-state.jitter, state.jitter)))
+        if state.bucket and not state.bucket.take():
+            with state.lock:
+                state.throttled += 1
+            self.send_response(429)
+            self.send_header("Retry-After", "1")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if state.error_rate and random.random() < state.error_rate:
+            with state.lock:
+                state.errors += 1
+            return self.send_json(503, {"error": "injected failure"})
+
+        if path.startswith("/sms"):
+            return self.handle_sms()
+        if method == "POST" and re.fullmatch(r"/members/member/list/[^/]+", path):
+            return self.handle_member_list(payload)
+        if path == "/members/member/points/set" and method == "PUT":
+            return self.handle_points_set(payload)
+        if path == "/members/member":
+            return self.handle_member(method, payload)
+
+        self.send_json(404, {"error": f"no mock for {method} {path}"})
+
+    def handle_sms(self):
+        with self.state.lock:
+            self.state.sms_sent += 1
+        self.send_body(200, b"OK", "text/plain")
+
+    def handle_member_list(self, payload):
+        filters = payload.get("filters") or {}
+        with self.state.lock:
+            members = self.state.find_member(filters)
+        offset = filters.get("offset") or 0
+        limit = filters.get("limit") or len(members)
+        page = members[offset:offset + limit]
+        # PassKit streams one {"result": member} object per line
+        self.send_body(200, "".join(json.dumps({"result": m}) + "\n" for m in page).encode())
+
+    def handle_member(self, method, payload):
+        external_id = payload.get("externalId")
+        with self.state.lock:
+            if method == "POST":
+                member = {**payload, "id": uuid.uuid4().hex[:22]}
+                self.state.members[external_id] = member
+                return self.send_json(200, {"id": member["id"]})
+
+            if external_id not in self.state.members:
+                return self.send_json(404, {"error": "member not found"})
+
+            if method == "PUT":
+                self.state.members[external_id].update(payload)
+                return self.send_json(200, {"id": self.state.members[external_id]["id"]})
+            if method == "DELETE":
+                self.state.members.pop(external_id)
+                return self.send_json(200, {})
+
+        self.send_json(405, {"error": "method not allowed"})
+
+    def handle_points_set(self, payload):
+        with self.state.lock:
+            member = self.state.members.get(payload.get("externalId"))
+            if not member:
+                return self.send_json(404, {"error": "member not found"})
+            member["points"] = payload.get("points")
+        self.send_json(200, {"id": member["id"]})
+
+
+def make_mock_server(host="127.0.0.1", port=0, **options):
+    """
+    Build the mock server; `options` are passed to MockState.
+    """
+    handler = type("BoundMockHandler", (MockHandler,), {"state": MockState(**options)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def start_mock_server(host="127.0.0.1", port=0, **options):
+    """
+    Serve the mocks from a background thread; returns (server, base_url).
+    """
+    server, base_url = make_mock_server(host, port, **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, base_url
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8700)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Added to every response")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Random +/- on top of the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 503")
+    parser.add_argument("--rate-limit", type=float, help="Requests per second before answering 429")
+    parser.add_argument("--burst", type=int, help="Token bucket size, defaults to one second of requests")
+    args = parser.parse_args()
+
+    server, base_url = make_mock_server(
+        args.host, args.port,
+        latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+        error_rate=args.error_rate, rate_limit=args.rate_limit, burst=args.burst,
+    )
+    print(f"PassKit mock: {base_url}  SMS mock: {base_url}/sms")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        state = server.RequestHandlerClass.state
+        print(f"{state.requests} requests, {state.errors} injected errors, {state.throttled} throttled, {state.sms_sent} sms")
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
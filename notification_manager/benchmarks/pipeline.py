@@ -0,0 +1,214 @@
+"""
+Benchmark the notification pipeline on a seeded site against local
+mock SMS and PassKit servers.
+
+    bench --site bench.local notification-manager benchmark --scale 100k
+"""
+import time
+from contextlib import contextmanager
+
+import frappe
+
+from notification_manager.benchmarks.mock_servers import start_mock_server
+from notification_manager.benchmarks.seed import BENCH_PREFIX, seed_benchmark_data
+
+SCALES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, round(pct / 100 * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+def summarize(latencies, elapsed=None):
+    """
+    Throughput and latency percentiles (ms) for a list of per-call seconds.
+    """
+    values = sorted(latencies)
+    elapsed = elapsed if elapsed is not None else sum(values)
+    return {
+        "calls": len(values),
+        "seconds": round(elapsed, 3),
+        "per_second": round(len(values) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p95_ms": round(percentile(values, 95) * 1000, 2),
+        "p99_ms": round(percentile(values, 99) * 1000, 2),
+        "max_ms": round(values[-1] * 1000, 2) if values else 0.0,
+    }
+
+
+def timed_calls(fn, args_list):
+    """
+    Time fn(*args) for each args; errors (e.g. injected by the mock) are
+    counted rather than aborting the run.
+    """
+    latencies = []
+    errors = 0
+    start = time.perf_counter()
+    for args in args_list:
+        call_start = time.perf_counter()
+        try:
+            fn(*args)
+        except Exception:
+            errors += 1
+        latencies.append(time.perf_counter() - call_start)
+    return {**summarize(latencies, time.perf_counter() - start), "errors": errors}
+
+
+@contextmanager
+def pointed_at_mocks(base_url):
+    """
+    Route SMS Settings and the PassKit site config to the mock server for
+    the duration of the block, restoring the real settings afterwards.
+    """
+    sms_fields = ["sms_gateway_url", "message_parameter", "receiver_parameter", "use_post"]
+    previous_sms = frappe.db.get_value("SMS Settings", None, sms_fields, as_dict=True) or {}
+    conf_keys = ("passkit_api_url", "passkit_pass_url", "passkit_api_key", "passkit_api_secret")
+    previous_conf = {key: frappe.conf.get(key) for key in conf_keys}
+
+    frappe.db.set_single_value("SMS Settings", {
+        "sms_gateway_url": f"{base_url}/sms",
+        "message_parameter": "text",
+        "receiver_parameter": "to",
+        "use_post": 0,
+    })
+    frappe.conf.update({
+        "passkit_api_url": base_url,
+        "passkit_pass_url": f"{base_url}/pass",
+        "passkit_api_key": previous_conf["passkit_api_key"] or "bench",
+        "passkit_api_secret": previous_conf["passkit_api_secret"] or "bench",
+    })
+    frappe.db.commit()
+    try:
+        yield
+    finally:
+        frappe.conf.update(previous_conf)
+        frappe.db.set_single_value("SMS Settings", {field: previous_sms.get(field) for field in sms_fields})
+        frappe.db.commit()
+
+
+def bench_daily_notifications():
+    from notification_manager.notification_manager.metrics import RunMetrics
+    from notification_manager.notification_manager.utils import run_daily_notifications
+
+    # The run itself: process_daily_notifications would skip it before
+    # the daily start time or once today's run is done
+    metrics = RunMetrics("Daily Notifications")
+    start = time.perf_counter()
+    run_daily_notifications(metrics)
+    elapsed = time.perf_counter() - start
+
+    run = metrics.save()
+    frappe.db.commit()
+    return {
+        "seconds": round(elapsed, 3),
+        "status": run.status,
+        "stages": [
+            {
+                "stage": stage.stage,
+                "calls": stage.calls,
+                "seconds": round(stage.duration, 3),
+                "rows": stage.rows,
+                "success": stage.success,
+                "failed": stage.failed,
+            }
+            for stage in run.stages
+        ],
+    }
+
+
+def bench_customer_create(customers):
+    from notification_manager.notification_manager.utils import on_customer_create
+
+    docs = [frappe.get_doc("Customer", name) for name in customers]
+    result = timed_calls(on_customer_create, [(doc, "after_insert") for doc in docs])
+    frappe.db.commit()
+    return result
+
+
+def bench_passkit(customers):
+    from notification_manager.notification_manager import api
+
+    results = {
+        "get_or_create_passkit_member": timed_calls(api.get_or_create_passkit_member, [(c,) for c in customers]),
+        "update_passkit_member": timed_calls(api.update_passkit_member, [(c,) for c in customers]),
+        "set_passkit_point": timed_calls(api.set_passkit_point, [(c,) for c in customers]),
+    }
+    results["flush_passkit_points"] = timed_calls(api.flush_passkit_points, [()])
+    frappe.db.commit()
+    return results
+
+
+def run_benchmark(scale="10k", seed=True, samples=200, **mock_options):
+    """
+    Seed `scale` synthetic customers (unless seed is False) and time the
+    daily job, the new-customer hook and the PassKit flows. `mock_options`
+    (latency, jitter, error_rate, rate_limit, burst) shape the mock server.
+    """
+    if not frappe.conf.allow_tests:
+        frappe.throw("Benchmarks write synthetic data; enable allow_tests on this site first")
+    if scale not in SCALES:
+        frappe.throw(f"Unknown scale {scale}, expected one of {', '.join(SCALES)}")
+
+    results = {"scale": scale}
+    if seed:
+        start = time.perf_counter()
+        seed_benchmark_data(SCALES[scale])
+        results["seed_seconds"] = round(time.perf_counter() - start, 3)
+
+    customers = frappe.get_all(
+        "Customer",
+        filters={"name": ["like", f"{BENCH_PREFIX}CUST-%"], "mobile_no": ["!=", ""]},
+        pluck="name",
+        order_by="name",
+        limit=samples,
+    )
+
+    server, base_url = start_mock_server(**mock_options)
+    try:
+        with pointed_at_mocks(base_url):
+            results["process_daily_notifications"] = bench_daily_notifications()
+            results["on_customer_create"] = bench_customer_create(customers)
+            results["passkit"] = bench_passkit(customers)
+            state = server.RequestHandlerClass.state
+            results["mock"] = {
+                "requests": state.requests,
+                "errors": state.errors,
+                "throttled": state.throttled,
+                "sms_sent": state.sms_sent,
+            }
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    return results
+
+
+def format_report(results):
+    lines = [f"scale: {results['scale']}"]
+    if "seed_seconds" in results:
+        lines.append(f"seed: {results['seed_seconds']:.1f}s")
+
+    daily = results["process_daily_notifications"]
+    lines.append(f"process_daily_notifications: {daily['seconds']:.2f}s ({daily['status']})")
+    for stage in daily["stages"]:
+        lines.append(
+            f"  {stage['stage']:<28}{stage['calls']:>8} calls{stage['seconds']:>10.3f}s"
+            f"{stage['rows']:>10} rows{stage['success']:>8} ok{stage['failed']:>8} failed"
+        )
+
+    flows = {"on_customer_create": results["on_customer_create"], **results["passkit"]}
+    lines.append(f"{'flow':<32}{'calls':>7}{'errors':>8}{'/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for flow, summary in flows.items():
+        lines.append(
+            f"{flow:<32}{summary['calls']:>7}{summary['errors']:>8}{summary['per_second']:>9.1f}"
+            f"{summary['p50_ms']:>10.2f}{summary['p95_ms']:>10.2f}{summary['p99_ms']:>10.2f}"
+        )
+    mock = results["mock"]
+    lines.append(
+        f"mock: {mock['requests']} requests, {mock['errors']} injected errors, "
+        f"{mock['throttled']} throttled, {mock['sms_sent']} sms"
+    )
+    return "\n".join(lines)
@@ -0,0 +1,168 @@
+"""
+Synthetic data for the notification pipeline benchmarks.
+
+Everything created here is named with the BENCH- prefix so it can be
+removed again with cleanup_benchmark_data.
+"""
+import random
+from datetime import date, timedelta
+
+import frappe
+from frappe.utils import now
+
+from notification_manager.notification_manager.customer import normalize_mobile
+
+BENCH_PREFIX = "BENCH-"
+BENCH_LOYALTY_PROGRAM = "LAC CLUB"
+CHUNK_SIZE = 10_000
+
+# (tier_name, min_spent) of the benchmark loyalty program
+BENCH_TIERS = [
+    ("Classic 1", 500_000),
+    ("Classic 2", 1_000_000),
+    ("Silver", 3_000_000),
+    ("Gold", 6_000_000),
+    ("Platinum", 12_000_000),
+]
+
+BENCH_RULES = {
+    "Birthday": "Happy birthday {customer_name}! {discount_value} off with {coupon_code}, valid {validity_days} days.",
+    "Membership Anniversary": "Thank you {customer_name}! {discount_value} off with {coupon_code}, valid {validity_days} days.",
+    "Loyalty Upgrade": "Welcome to {loyalty_tier}, {customer_name}! {discount_value} off with {coupon_code}, valid {validity_days} days.",
+    "New Registration": "Welcome {customer_name}! {discount_value} off with {coupon_code}, valid {validity_days} days.",
+}
+
+
+def ensure_loyalty_program():
+    if frappe.db.exists("Loyalty Program", BENCH_LOYALTY_PROGRAM):
+        return
+
+    company = frappe.db.get_value("Company", {}, "name")
+    doc = frappe.get_doc({
+        "doctype": "Loyalty Program",
+        "loyalty_program_name": BENCH_LOYALTY_PROGRAM,
+        "loyalty_program_type": "Multiple Tier Program",
+        "from_date": "2020-01-01",
+        "company": company,
+        "conversion_factor": 1,
+        "expiry_duration": 365,
+        "collection_rules": [
+            {"tier_name": tier_name, "min_spent": min_spent, "collection_factor": 1000}
+            for tier_name, min_spent in BENCH_TIERS
+        ]
+    })
+    doc.flags.ignore_mandatory = True
+    doc.insert(ignore_permissions=True, ignore_links=True)
+
+
+def ensure_notification_rules():
+    for event_type, template in BENCH_RULES.items():
+        rule_name = f"{BENCH_PREFIX}{event_type}"
+        if frappe.db.exists("Notification Rule", {"rule_name": rule_name}):
+            continue
+
+        frappe.get_doc({
+            "doctype": "Notification Rule",
+            "rule_name": rule_name,
+            "enabled": 1,
+            "event_type": event_type,
+            "discount_type": "Amount",
+            "loyalty_program": BENCH_LOYALTY_PROGRAM,
+            "discount_value": 5000,
+            "validity_days": 30,
+            "message_template": template,
+            "tier_discounts": [
+                {"loyalty_program": BENCH_LOYALTY_PROGRAM, "tier_name": tier_name, "discount_value": 5000 * (i + 1)}
+                for i, (tier_name, _) in enumerate(BENCH_TIERS)
+            ]
+        }).insert(ignore_permissions=True)
+
+
+def random_date(rng, start, days):
+    return start + timedelta(days=rng.randrange(days))
+
+
+def seed_customers(count, rng):
+    fields = [
+        "name", "customer_name", "customer_type", "customer_group", "territory",
+        "mobile_no", "custom_mobile_e164", "custom_birthday", "custom_member_date", "loyalty_program",
+        "loyalty_program_tier", "custom_loyalty_points",
+        "owner", "modified_by", "creation", "modified", "docstatus", "idx",
+    ]
+    timestamp = now()
+    today = date.today()
+
+    for start in range(0, count, CHUNK_SIZE):
+        values = []
+        for i in range(start, min(start + CHUNK_SIZE, count)):
+            # ~2% have no reachable mobile, like real data
+            mobile = None if rng.random() < 0.02 else f"9{i:07d}"
+            values.append((
+                f"{BENCH_PREFIX}CUST-{i:08d}", f"Bench Customer {i}", "Individual",
+                "All Customer Groups", "All Territories",
+                # bulk_insert skips the validate hook that normalizes it
+                mobile or "", normalize_mobile(mobile),
+                random_date(rng, date(1960, 1, 1), 40 * 365),
+                random_date(rng, today - timedelta(days=6 * 365), 6 * 365),
+                BENCH_LOYALTY_PROGRAM, rng.choice(BENCH_TIERS)[0], rng.randrange(0, 5000),
+                "Administrator", "Administrator", timestamp, timestamp, 0, 0,
+            ))
+        frappe.db.bulk_insert("Customer", fields, values, ignore_duplicates=True)
+        frappe.db.commit()
+
+
+def seed_loyalty_point_entries(count, rng, entries_per_customer=3):
+    fields = [
+        "name", "customer", "loyalty_program", "loyalty_program_tier", "posting_date",
+        "expiry_date", "loyalty_points", "purchase_amount", "company",
+        "owner", "modified_by", "creation", "modified", "docstatus", "idx",
+    ]
+    timestamp = now()
+    today = date.today()
+    company = frappe.db.get_value("Company", {}, "name")
+    total = count * entries_per_customer
+
+    for start in range(0, total, CHUNK_SIZE):
+        values = []
+        for i in range(start, min(start + CHUNK_SIZE, total)):
+            posting_date = random_date(rng, today - timedelta(days=365), 365)
+            # About one in ten entries is a redemption
+            redeemed = rng.random() < 0.1
+            values.append((
+                f"{BENCH_PREFIX}LPE-{i:09d}", f"{BENCH_PREFIX}CUST-{i % count:08d}",
+                BENCH_LOYALTY_PROGRAM, rng.choice(BENCH_TIERS)[0], posting_date,
+                posting_date + timedelta(days=365),
+                -rng.randrange(1, 500) if redeemed else rng.randrange(1, 2000),
+                0 if redeemed else round(rng.lognormvariate(12, 1.2), 2), company,
+                "Administrator", "Administrator", timestamp, timestamp, 1, 0,
+            ))
+        frappe.db.bulk_insert("Loyalty Point Entry", fields, values, ignore_duplicates=True)
+        frappe.db.commit()
+
+
+def seed_benchmark_data(count, seed=42):
+    """
+    Seed `count` customers with birthdays, member dates and three Loyalty
+    Point Entries each, plus the loyalty program and notification rules.
+    Rows are generated and inserted in chunks, so 1M customers is fine.
+    """
+    rng = random.Random(seed)
+    ensure_loyalty_program()
+    ensure_notification_rules()
+    seed_customers(count, rng)
+    seed_loyalty_point_entries(count, rng)
+    frappe.db.commit()
+
+
+def cleanup_benchmark_data():
+    customers = f"{BENCH_PREFIX}CUST-%"
+    for doctype, field in (
+        ("Notification Log", "customer"),
+        ("Coupon Code", "customer"),
+        ("Passkit Member", "customer_name"),
+        ("Loyalty Point Entry", "customer"),
+    ):
+        frappe.db.delete(doctype, {field: ["like", customers]})
+    frappe.db.delete("Customer", {"name": ["like", customers]})
+    frappe.db.delete("Notification Rule", {"rule_name": ["like", f"{BENCH_PREFIX}%"]})
+    frappe.db.commit()
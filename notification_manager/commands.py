@@ -0,0 +1,87 @@
+import click
+import frappe
+from frappe.commands import get_site, pass_context
+
+
+@click.group("notification-manager")
+def notification_manager():
+    """Notification Manager maintenance commands"""
+
+
+@notification_manager.command("replay-tiers")
+@click.option("--from", "from_date", required=True, help="First posting date to replay (YYYY-MM-DD)")
+@click.option("--to", "to_date", required=True, help="Last posting date to replay (YYYY-MM-DD)")
+@pass_context
+def replay_tiers(context, from_date, to_date):
+    """Replay loyalty tier history and report every tier change"""
+    from notification_manager.notification_manager.loyalty import iter_tier_changes
+
+    frappe.init(site=get_site(context))
+    frappe.connect()
+    try:
+        changes = 0
+        for change in iter_tier_changes(from_date, to_date):
+            changes += 1
+            click.echo(
+                f"{change.posting_date}\t{change.customer}\t{change.loyalty_program}\t"
+                f"{change.previous_tier} -> {change.new_tier}\t"
+                f"{change.previous_total:.2f} -> {change.current_total:.2f}"
+            )
+        click.echo(f"{changes} tier change(s) between {from_date} and {to_date}", err=True)
+    finally:
+        frappe.destroy()
+
+
+@notification_manager.command("retier")
+@click.option("--as-of", "as_of", required=True, help="Date to compute tiers for (YYYY-MM-DD)")
+@click.option("--previous", "previous_as_of", help="Date to compare against, defaults to the day before")
+@pass_context
+def retier(context, as_of, previous_as_of=None):
+    """Classify every customer at once and report tier changes"""
+    from notification_manager.notification_manager.loyalty import get_bulk_tiers
+
+    frappe.init(site=get_site(context))
+    frappe.connect()
+    try:
+        tiers = get_bulk_tiers(as_of, previous_as_of)
+        changed = tiers.changed()
+        for i in changed.nonzero()[0]:
+            click.echo(
+                f"{tiers.customer[i]}\t{tiers.loyalty_program[i]}\t"
+                f"{tiers.previous_tier[i]} -> {tiers.new_tier[i]}\t"
+                f"{tiers.previous_total[i]:.2f} -> {tiers.current_total[i]:.2f}"
+            )
+        click.echo(f"{changed.sum()} of {len(changed)} customer(s) change tier", err=True)
+    finally:
+        frappe.destroy()
+
+
+@notification_manager.command("benchmark")
+@click.option("--scale", type=click.Choice(["10k", "100k", "1m"]), default="10k", help="Number of synthetic customers")
+@click.option("--skip-seed", is_flag=True, default=False, help="Reuse previously seeded BENCH- data")
+@click.option("--samples", type=int, default=200, help="Customers to run the per-customer flows for")
+@click.option("--cleanup", is_flag=True, default=False, help="Delete the BENCH- data afterwards")
+@click.option("--latency-ms", type=float, default=0.0, help="Mock server response latency")
+@click.option("--error-rate", type=float, default=0.0, help="Share of mock requests answered with 503")
+@click.option("--rate-limit", type=float, help="Mock requests per second before answering 429")
+@pass_context
+def benchmark(context, scale, skip_seed=False, samples=200, cleanup=False, latency_ms=0.0, error_rate=0.0, rate_limit=None):
+    """Benchmark the notification pipeline against local mock servers"""
+    from notification_manager.benchmarks.pipeline import format_report, run_benchmark
+    from notification_manager.benchmarks.seed import cleanup_benchmark_data
+
+    frappe.init(site=get_site(context))
+    frappe.connect()
+    try:
+        results = run_benchmark(
+            scale, seed=not skip_seed, samples=samples,
+            latency=latency_ms / 1000, error_rate=error_rate, rate_limit=rate_limit,
+        )
+        click.echo(format_report(results))
+        if cleanup:
+            cleanup_benchmark_data()
+    finally:
+        frappe.destroy()
+
+
+commands = [notification_manager]
@@ -8,17 +8,45 @@ app_license = "mit"
 # Document Events
 doc_events = {
     "Customer": {
-        "after_insert": "notification_manager.notification_manager.utils.on_customer_create"
+        "validate": "notification_manager.notification_manager.customer.set_mobile_e164",
+        "after_insert": "notification_manager.notification_manager.utils.on_customer_create",
+        "on_update": "notification_manager.notification_manager.api.on_customer_update"
+    },
+    "Item": {
+        "on_update": "notification_manager.notification_manager.stock.mark_stock_dirty"
+    },
+    "Bin": {
+        "on_update": "notification_manager.notification_manager.stock.mark_stock_dirty"
+    },
+    "Stock Ledger Entry": {
+        "on_submit": "notification_manager.notification_manager.stock.mark_stock_dirty",
+        "on_cancel": "notification_manager.notification_manager.stock.mark_stock_dirty"
     }
 }
 
 # Scheduled Tasks
 scheduler_events = {
     "cron": {
-        "45 10 * * *": [
+        "0 2 * * *": [
+            "notification_manager.notification_manager.schedule.prepare_notification_schedule"
+        ],
+        # Retried until done so a crashed run's lease is taken over;
+        # runs before notification_daily_start (10:45) return at once
+        "*/5 10-12 * * *": [
             "notification_manager.notification_manager.utils.process_daily_notifications"
+        ],
+        "* * * * *": [
+            "notification_manager.notification_manager.api.flush_passkit_points",
+            "notification_manager.notification_manager.api.process_passkit_webhook_events",
+            "notification_manager.notification_manager.api.retry_passkit_mutations",
+            "notification_manager.notification_manager.utils.send_import_welcome_notifications",
+            "notification_manager.notification_manager.schedule.dispatch_due_notifications",
+            "notification_manager.notification_manager.redrive.redrive_failed_notifications"
         ]
-    }
+    },
+    "hourly": [
+        "notification_manager.notification_manager.stock.build_stock_snapshot"
+    ]
 }
 
 # Apps
@@ -99,7 +127,7 @@ scheduler_events = {
 # ------------
 
 # before_install = "notification_manager.install.before_install"
-# after_install = "notification_manager.install.after_install"
+after_install = "notification_manager.install.after_install"
 
 # Uninstallation
 # ------------
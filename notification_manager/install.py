@@ -0,0 +1,9 @@
+from notification_manager.notification_manager.customer import create_customer_fields
+from notification_manager.patches.add_deleted_document_index import execute as add_deleted_document_index
+
+
+def after_install():
+    # Patches are only marked as run on a fresh install, so create the
+    # fields and indexes they would have added here
+    create_customer_fields()
+    add_deleted_document_index()
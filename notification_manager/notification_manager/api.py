@@ -1,14 +1,59 @@
-import time
-import json
-import hmac
-import hashlib
 import base64
-import requests
+import hashlib
+import hmac
+import importlib.util
+import json
+import pickle
+import random
+import time
+
 import frappe
+import requests
+from werkzeug.wrappers import Response
 
+from notification_manager.notification_manager.profiling import profiled, record_http_call
+from notification_manager.notification_manager.serializers import iter_msgpack_chunks, to_columnar
+from notification_manager.notification_manager.stock import get_stock_snapshot, get_stock_version
 
+# Production defaults; each can be overridden in site_config.json with
+# passkit_api_url, passkit_program_id, passkit_tier_id and passkit_pass_url
+PASSKIT_API_URL = "https://api.pub2.passkit.io"
 PASSKIT_PROGRAM_ID = "2iFGNn4w5c4CJgdciL7BAm"
 PASSKIT_TIER_ID = "base"
+PASSKIT_PASS_URL = "https://pub2.pskt.io"
+
+# Item columns returned by get_item_with_qty unless the caller picks its own
+DEFAULT_ITEM_FIELDS = ["name", "item_code", "item_name", "item_group", "stock_uom", "disabled"]
+ITEM_PAGE_SIZE = 500
+MAX_ITEM_PAGE_SIZE = 5000
+
+ITEM_RESPONSE_FORMATS = ("json", "columnar", "msgpack")
+
+# Seconds get_item_changes stays behind now to not skip late commits
+ITEM_CHANGES_LAG = 5
+
+# Redis hash of customer -> latest loyalty points waiting to be pushed
+PASSKIT_PENDING_POINTS_KEY = "passkit_pending_points"
+
+# Redis list of raw webhook events waiting to be applied to Passkit Member
+PASSKIT_WEBHOOK_QUEUE_KEY = "passkit_webhook_events"
+
+# Redis list of PassKit mutations that failed and wait to be replayed
+PASSKIT_RETRY_QUEUE_KEY = "passkit_retry_queue"
+
+# Circuit breaker state shared by every worker through Redis
+PASSKIT_BREAKER_FAILURES_KEY = "passkit_breaker_failures"
+PASSKIT_BREAKER_OPEN_KEY = "passkit_breaker_open"
+PASSKIT_BREAKER_PROBE_KEY = "passkit_breaker_probe"
+
+# PassKit webhook event -> Passkit Member fields it sets
+PASSKIT_WEBHOOK_EVENTS = {
+    "PASS_EVENT_INSTALLED": {"pass_status": "Installed"},
+    "PASS_EVENT_UNINSTALLED": {"pass_status": "Uninstalled"},
+    "PASS_EVENT_RECORD_CREATED": {"passkit_status": "ENROLLED"},
+    "PASS_EVENT_RECORD_UPDATED": {},
+    "PASS_EVENT_RECORD_DELETED": {"passkit_status": "DELETED"},
+}
 
 
 def base64url_encode(data):
@@ -51,25 +96,195 @@ def generate_passkit_jwt():
     return jwt
 
 
-def create_passkit_member_doc(member_data):
-    doc = frappe.get_doc(member_data)
-    
-    doc.insert(ignore_permissions=True)   # use ignore_permissions only if needed
+def get_passkit_settings():
+    conf = frappe.conf
+    return frappe._dict(
+        api_url=(conf.get("passkit_api_url") or PASSKIT_API_URL).rstrip("/"),
+        program_id=conf.get("passkit_program_id") or PASSKIT_PROGRAM_ID,
+        tier_id=conf.get("passkit_tier_id") or PASSKIT_TIER_ID,
+        pass_url=(conf.get("passkit_pass_url") or PASSKIT_PASS_URL).rstrip("/"),
+    )
+
+
+class PassKitUnavailableError(frappe.ValidationError):
+    http_status_code = 503
+
+
+def passkit_circuit_allows():
+    """
+    False while the circuit is open. Once the cool-down has passed a
+    single worker is let through as a probe, the others keep failing fast.
+    """
+    cache = frappe.cache()
+    if cache.get(cache.make_key(PASSKIT_BREAKER_OPEN_KEY)):
+        return False
+
+    failures = int(cache.get(cache.make_key(PASSKIT_BREAKER_FAILURES_KEY)) or 0)
+    if failures < (frappe.conf.passkit_breaker_threshold or 5):
+        return True
+
+    cooldown = frappe.conf.passkit_breaker_cooldown or 30
+    return bool(cache.set(cache.make_key(PASSKIT_BREAKER_PROBE_KEY), 1, nx=True, ex=cooldown))
+
+
+def record_passkit_success():
+    cache = frappe.cache()
+    cache.delete(cache.make_key(PASSKIT_BREAKER_FAILURES_KEY), cache.make_key(PASSKIT_BREAKER_PROBE_KEY))
+
+
+def record_passkit_failure():
+    """
+    Count a consecutive failure and open the circuit at the threshold.
+    """
+    cache = frappe.cache()
+    cooldown = frappe.conf.passkit_breaker_cooldown or 30
+
+    pipe = cache.pipeline()
+    pipe.incr(cache.make_key(PASSKIT_BREAKER_FAILURES_KEY))
+    pipe.expire(cache.make_key(PASSKIT_BREAKER_FAILURES_KEY), 10 * cooldown)
+    failures, _ = pipe.execute()
+
+    if failures >= (frappe.conf.passkit_breaker_threshold or 5):
+        cache.set(cache.make_key(PASSKIT_BREAKER_OPEN_KEY), 1, ex=cooldown)
+
+
+def queue_passkit_retry(method, url, payload, attempts=0, queued_at=None):
+    entry = {
+        "method": method,
+        "url": url,
+        "payload": payload,
+        "attempts": attempts,
+        "queued_at": queued_at or frappe.utils.now()
+    }
+    frappe.cache().rpush(PASSKIT_RETRY_QUEUE_KEY, json.dumps(entry, default=str))
+
+
+def passkit_request(method, url, jwt_token, payload, retries=2, queue_on_failure=False, stream=False):
+    """
+    Call PassKit through the shared circuit breaker.
+
+    Connection errors, 429 and 5xx responses are retried with jittered
+    exponential backoff. When the circuit is open or retries run out,
+    PassKitUnavailableError is raised, or with queue_on_failure the call
+    is put on the retry queue and None is returned.
+    """
+    headers = {
+        "Authorization": jwt_token,
+        "Content-Type": "application/json"
+    }
+
+    response = None
+    for attempt in range(retries + 1):
+        if not passkit_circuit_allows():
+            break
+
+        if attempt:
+            # Full jitter keeps workers from retrying in lockstep
+            time.sleep(random.uniform(0, min(0.2 * 2 ** attempt, 2)))
+
+        start = time.perf_counter()
+        try:
+            response = requests.request(
+                method, url, headers=headers, json=payload, timeout=frappe.conf.passkit_timeout or 10,
+                stream=stream
+            )
+        except requests.RequestException:
+            response = None
+            record_http_call(method, url, None, time.perf_counter() - start)
+            record_passkit_failure()
+            continue
+        record_http_call(method, url, response.status_code, time.perf_counter() - start)
+
+        if response.status_code != 429 and response.status_code < 500:
+            record_passkit_success()
+            return response
+
+        record_passkit_failure()
+
+    if queue_on_failure:
+        queue_passkit_retry(method, url, payload)
+        return None
+
+    if response is not None:
+        # Let the caller report the upstream error as before
+        return response
+
+    raise PassKitUnavailableError("PassKit is unavailable, please try again later")
+
+
+def retry_passkit_mutations(batch_size=100, max_attempts=10):
+    """
+    Replay queued PassKit mutations (scheduled every minute).
+    Nothing is sent while the circuit is open.
+    """
+    cache = frappe.cache()
+    key = cache.make_key(PASSKIT_RETRY_QUEUE_KEY)
+
+    pipe = cache.pipeline()
+    pipe.lrange(key, 0, batch_size - 1)
+    pipe.ltrim(key, batch_size, -1)
+    entries, _ = pipe.execute()
+
+    if not entries:
+        return
+
+    jwt_token = generate_passkit_jwt()
+
+    for i, entry in enumerate(entries):
+        entry = json.loads(entry)
+        if is_stale_member_update(entry):
+            continue
+
+        try:
+            response = passkit_request(entry["method"], entry["url"], jwt_token, entry["payload"], retries=0)
+        except PassKitUnavailableError:
+            # Circuit is open: put this and the remaining entries back at
+            # the head, in order, so they are not replayed after newer ones
+            pipe = cache.pipeline()
+            pipe.lpush(key, *reversed(entries[i:]))
+            pipe.execute()
+            break
+
+        if response.status_code in [200, 201]:
+            if is_member_update(entry):
+                mark_passkit_member_synced(entry["payload"])
+        elif response.status_code >= 500 or response.status_code == 429:
+            if entry["attempts"] + 1 < max_attempts:
+                queue_passkit_retry(
+                    entry["method"], entry["url"], entry["payload"], entry["attempts"] + 1, entry.get("queued_at")
+                )
+            else:
+                frappe.log_error('Passkit Retry', f'Giving up after {max_attempts} attempts: {entry}')
+
     frappe.db.commit()
 
 
-def enroll_passkit_member_api(customer, jwt_token):
+def is_member_update(entry):
+    # A queued update_passkit_member_api call
+    return entry["method"] == "PUT" and "person" in entry["payload"]
+
+
+def is_stale_member_update(entry):
     """
-    Enroll a new PassKit member using ERPNext Customer data.
+    True for a queued member update that a direct sync made after it was
+    queued has superseded; replaying it would put the old fields back.
     """
+    if not is_member_update(entry) or not entry.get("queued_at"):
+        return False
 
-    url = "https://api.pub2.passkit.io/members/member"
+    last_synced_on = frappe.db.get_value(
+        "Passkit Member", {"customer_name": entry["payload"]["externalId"]}, "last_synced_on"
+    )
+    if not last_synced_on:
+        return False
+    return frappe.utils.get_datetime(last_synced_on) > frappe.utils.get_datetime(entry["queued_at"])
 
-    payload = {
-        "externalId": customer.name,      # Use ERPNext Customer ID
-        "tierId": PASSKIT_TIER_ID,
-        "programId": PASSKIT_PROGRAM_ID,
 
+def get_passkit_member_fields(customer):
+    """
+    Customer fields PassKit keeps a copy of (person, metaData and points).
+    """
+    return {
         "person": {
             "displayName": customer.customer_name,
             "forename": customer.customer_name,
@@ -84,16 +299,66 @@ def enroll_passkit_member_api(customer, jwt_token):
             "erpnext_customer": customer.name
         },
 
-        "points": customer.custom_loyalty_points,
-        "status": "ENROLLED"
+        "points": customer.custom_loyalty_points
     }
 
-    headers = {
-        "Authorization": jwt_token,
-        "Content-Type": "application/json"
+
+def get_passkit_sync_hash(customer):
+    """
+    Content hash of the synced fields, stored on Passkit Member.
+    """
+    return hash_passkit_member_fields(get_passkit_member_fields(customer))
+
+
+def hash_passkit_member_fields(fields):
+    fields = json.dumps(fields, sort_keys=True, default=str)
+    return hashlib.sha256(fields.encode()).hexdigest()
+
+
+def mark_passkit_member_synced(payload):
+    """
+    Store the hash of a member payload PassKit accepted from the retry queue.
+    """
+    fields = {field: payload.get(field) for field in ("person", "metaData", "points")}
+    frappe.db.set_value(
+        "Passkit Member",
+        {"customer_name": payload["externalId"]},
+        {"sync_hash": hash_passkit_member_fields(fields), "last_synced_on": frappe.utils.now()}
+    )
+
+
+def passkit_member_changed(customer):
+    """
+    True when the customer differs from what was last sent to PassKit.
+    """
+    stored_hash = frappe.db.get_value("Passkit Member", {"customer_name": customer.name}, "sync_hash")
+    return stored_hash != get_passkit_sync_hash(customer)
+
+
+def create_passkit_member_doc(member_data):
+    doc = frappe.get_doc(member_data)
+    
+    doc.insert(ignore_permissions=True)   # use ignore_permissions only if needed
+
+
+def enroll_passkit_member_api(customer, jwt_token):
+    """
+    Enroll a new PassKit member using ERPNext Customer data.
+    """
+
+    settings = get_passkit_settings()
+    url = f"{settings.api_url}/members/member"
+
+    payload = {
+        "externalId": customer.name,      # Use ERPNext Customer ID
+        "tierId": settings.tier_id,
+        "programId": settings.program_id,
+
+        **get_passkit_member_fields(customer),
+        "status": "ENROLLED"
     }
 
-    response = requests.post(url, headers=headers, json=payload)
+    response = passkit_request("POST", url, jwt_token, payload, retries=0)
 
     try:
         body = response.json()
@@ -105,12 +370,14 @@ def enroll_passkit_member_api(customer, jwt_token):
             "doctype": "Passkit Member",   # your custom Doctype name
             "passkit_id": body['id'],
             "customer_name": customer.name,
-            "passkit_status": "ENROLLED"
+            "passkit_status": "ENROLLED",
+            "sync_hash": get_passkit_sync_hash(customer),
+            "last_synced_on": frappe.utils.now()
         })
         
         return {
             "status": "created",
-            "url": f'https://pub2.pskt.io/{body['id']}'
+            "url": f"{settings.pass_url}/{body['id']}"
         }
 
     return {
@@ -124,38 +391,32 @@ def enroll_passkit_member_api(customer, jwt_token):
 def update_passkit_member_api(customer, jwt_token):
     """
     Update a member using ERPNext Customer data.
+    Skipped when the synced fields hash to the stored sync_hash.
     """
 
-    url = "https://api.pub2.passkit.io/members/member"
+    sync_hash = get_passkit_sync_hash(customer)
+    stored_hash = frappe.db.get_value("Passkit Member", {"customer_name": customer.name}, "sync_hash")
+    if stored_hash == sync_hash:
+        return {
+            "status": "unchanged"
+        }
+
+    settings = get_passkit_settings()
+    url = f"{settings.api_url}/members/member"
 
     payload = {
         "externalId": customer.name,      # Use ERPNext Customer ID
-        "tierId": PASSKIT_TIER_ID,
-        "programId": PASSKIT_PROGRAM_ID,
-
-        "person": {
-            "displayName": customer.customer_name,
-            "forename": customer.customer_name,
-            "gender": "NOT_KNOWN",
-            "emailAddress": customer.email_id or "",
-            "mobileNumber": customer.mobile_no or customer.phone,
-            "externalId": customer.name,
-        },
-
-        "metaData": {
-            "source": "ERPNext",
-            "erpnext_customer": customer.name
-        },
-
-        "points": customer.custom_loyalty_points
-    }
+        "tierId": settings.tier_id,
+        "programId": settings.program_id,
 
-    headers = {
-        "Authorization": jwt_token,
-        "Content-Type": "application/json"
+        **get_passkit_member_fields(customer)
     }
 
-    response = requests.put(url, headers=headers, json=payload)
+    response = passkit_request("PUT", url, jwt_token, payload, queue_on_failure=True)
+    if response is None:
+        return {
+            "status": "queued"
+        }
     
     try:
         body = response.json()
@@ -163,6 +424,11 @@ def update_passkit_member_api(customer, jwt_token):
         body = None
         
     if response.status_code in [200, 201]:
+        frappe.db.set_value(
+            "Passkit Member",
+            {"customer_name": customer.name},
+            {"sync_hash": sync_hash, "last_synced_on": frappe.utils.now()}
+        )
         return {
             "status": "updated"
         }
@@ -178,24 +444,25 @@ def delete_passkit_member_api(customer, jwt_token):
     Enroll a new PassKit member using ERPNext Customer data.
     """
 
-    url = "https://api.pub2.passkit.io/members/member"
+    settings = get_passkit_settings()
+    url = f"{settings.api_url}/members/member"
 
     payload = {
         "externalId": customer.name,
-        "programId": PASSKIT_PROGRAM_ID,
-    }
-
-    headers = {
-        "Authorization": jwt_token,
-        "Content-Type": "application/json"
+        "programId": settings.program_id,
     }
 
-    response = requests.delete(url, headers=headers, json=payload)
+    response = passkit_request("DELETE", url, jwt_token, payload, queue_on_failure=True)
     
     exists = frappe.db.exists("Passkit Member", {"customer_name": customer.name})
     if exists:
         frappe.delete_doc("Passkit Member", exists)
-        frappe.db.commit()
+
+    if response is None:
+        return {
+            "externalId": customer.name,
+            "status": "queued"
+        }
 
     try:
         body = response.json()
@@ -221,22 +488,18 @@ def set_passkit_point_api(customer, jwt_token):
     Update a member using ERPNext Customer data.
     """
 
-    url = "https://api.pub2.passkit.io/members/member/points/set"
+    settings = get_passkit_settings()
+    url = f"{settings.api_url}/members/member/points/set"
 
     payload = {
         "externalId": customer.name,      # Use ERPNext Customer ID
-        "tierId": PASSKIT_TIER_ID,
-        "programId": PASSKIT_PROGRAM_ID,
+        "tierId": settings.tier_id,
+        "programId": settings.program_id,
 
         "points": customer.custom_loyalty_points
     }
 
-    headers = {
-        "Authorization": jwt_token,
-        "Content-Type": "application/json"
-    }
-
-    response = requests.put(url, headers=headers, json=payload)
+    response = passkit_request("PUT", url, jwt_token, payload)
     
     try:
         body = response.json()
@@ -250,30 +513,158 @@ def set_passkit_point_api(customer, jwt_token):
     else:
         frappe.log_error('Passkit SetPoint', f'code: {response.status_code}, body: {body}')
         return {
-            "status": "failed"
+            "status": "failed",
+            "http_status": response.status_code
         }
 
 
+def queue_passkit_point(customer_name, points):
+    """
+    Store the latest loyalty points for a member in its pending slot.
+    A newer value simply overwrites an older one that was not pushed yet.
+    """
+    frappe.cache().hset(PASSKIT_PENDING_POINTS_KEY, customer_name, points)
+
+
+def flush_passkit_points():
+    """
+    Push every pending point slot to PassKit (scheduled every minute).
+    N updates per member within the window end up as a single PUT.
+    """
+    cache = frappe.cache()
+    key = cache.make_key(PASSKIT_PENDING_POINTS_KEY)
+
+    # Take the whole hash atomically so updates arriving meanwhile
+    # land in a fresh slot for the next run
+    pipe = cache.pipeline()
+    pipe.hgetall(key)
+    pipe.delete(key)
+    pending, _ = pipe.execute()
+
+    if not pending:
+        return
+
+    jwt_token = generate_passkit_jwt()
+
+    for customer_name, points in pending.items():
+        customer = frappe._dict(
+            name=frappe.safe_decode(customer_name),
+            custom_loyalty_points=pickle.loads(points)
+        )
+
+        try:
+            result = set_passkit_point_api(customer, jwt_token)
+        except PassKitUnavailableError:
+            result = {"status": "failed"}
+
+        # Put transient failures back unless a newer value arrived already;
+        # other 4xx means the member is gone or the payload is rejected, so drop it
+        http_status = result.get("http_status") or 500
+        if result["status"] == "failed" and (http_status >= 500 or http_status == 429):
+            cache.hsetnx(key, customer.name, points)
+
+
+def get_item_fields(fields, extra=None):
+    """
+    Validate the caller's Item column projection; `name` is always included.
+    """
+    fields = frappe.parse_json(fields) if fields else DEFAULT_ITEM_FIELDS
+    valid_fields = frappe.get_meta("Item").get_valid_columns()
+    invalid_fields = [field for field in fields if field not in valid_fields]
+    if invalid_fields:
+        frappe.throw(f"Invalid Item field(s): {', '.join(map(str, invalid_fields))}")
+
+    return list(dict.fromkeys(["name", *fields, *(extra or [])]))
+
+
 @frappe.whitelist()
-def get_item_with_qty():
+@profiled
+def get_item_with_qty(fields=None, warehouse=None, after=None, limit=ITEM_PAGE_SIZE, version=None, format="json"):
     """
-    Fetch items with their actual quantities using a SQL query.
+    Fetch one page of items with their quantity summed over bins.
+
+    fields: Item columns to return (JSON list), defaults to DEFAULT_ITEM_FIELDS
+    warehouse: only count stock held in this warehouse
+    after: `next_cursor` of the previous page, omit for the first page
+    limit: page size, capped at MAX_ITEM_PAGE_SIZE
+    version: `version` of an earlier response; a first page request is
+        answered with "not_modified" from Redis alone when no Item or Bin
+        changed since. Later pages ignore it, and it only holds for the
+        same fields, warehouse and format, so omit it when those change
+    format: "json" (one dict per row), "columnar" (column names once plus
+        one value array per column) or "msgpack" (a stream of columnar
+        msgpack chunks, cursor and version in X-Next-Cursor/X-Version)
     """
+    if format not in ITEM_RESPONSE_FORMATS:
+        frappe.throw(f"Unsupported format {format}, use one of: {', '.join(ITEM_RESPONSE_FORMATS)}")
+
+    if format == "msgpack" and not importlib.util.find_spec("msgpack"):
+        frappe.throw("The msgpack format needs the msgpack package installed on the server")
+
+    current_version = get_stock_version()
+    # A client mid-way through the pages still needs the rest of them
+    if version and not after and frappe.utils.cint(version) == current_version:
+        return {
+            "status": "not_modified",
+            "version": current_version
+        }
+
+    fields = get_item_fields(fields)
+
+    limit = min(frappe.utils.cint(limit) or ITEM_PAGE_SIZE, MAX_ITEM_PAGE_SIZE)
+
     try:
-        # Execute the SQL query
+        # Keyset page over the Item primary key; quantities are summed per
+        # item through the Bin item_code index instead of one row per bin
         query = """
             SELECT 
-                ti.*, 
-                tb.actual_qty 
-            FROM 
+                {columns},
+                (
+                    SELECT COALESCE(SUM(tb.actual_qty), 0)
+                    FROM `tabBin` tb
+                    WHERE tb.item_code = ti.name
+                    {warehouse_condition}
+                ) AS actual_qty
+            FROM
                 `tabItem` ti
-            LEFT JOIN 
-                `tabBin` tb 
-            ON 
-                ti.name = tb.item_code
-        """
-        result = frappe.db.sql(query, as_dict=True)  # Fetch results as a list of dictionaries
-        return result
+            WHERE
+                ti.name > %(after)s
+            ORDER BY
+                ti.name
+            LIMIT %(limit)s
+        """.format(
+            columns=", ".join(f"ti.`{field}`" for field in fields),
+            warehouse_condition="AND tb.warehouse = %(warehouse)s" if warehouse else ""
+        )
+        items = frappe.db.sql(
+            query,
+            {"after": after or "", "warehouse": warehouse, "limit": limit},
+            as_dict=(format == "json")
+        )
+        next_cursor = items[-1][0 if format != "json" else "name"] if len(items) == limit else None
+        columns = [*fields, "actual_qty"]
+
+        if format == "msgpack":
+            # Rows are fetched already; only encoding is streamed, the
+            # DB connection is closed by the time the body is sent
+            return Response(
+                iter_msgpack_chunks(columns, items),
+                mimetype="application/msgpack",
+                headers={"X-Next-Cursor": next_cursor or "", "X-Version": str(current_version or "")}
+            )
+
+        if format == "columnar":
+            return {
+                **to_columnar(columns, items),
+                "next_cursor": next_cursor,
+                "version": current_version
+            }
+
+        return {
+            "items": items,
+            "next_cursor": next_cursor,
+            "version": current_version
+        }
     except Exception as e:
         # Log error and return error message
         frappe.log_error(frappe.get_traceback(), 'API Error: get_item_with_qty')
@@ -281,6 +672,99 @@ def get_item_with_qty():
 
 
 @frappe.whitelist()
+@profiled
+def get_item_changes(cursor=None, fields=None, limit=ITEM_PAGE_SIZE):
+    """
+    Items and Bins modified or deleted since `cursor`, for incremental
+    POS sync. `deleted` lists the Item and Bin names removed (Bins with
+    their item_code and warehouse), read from Deleted Document.
+
+    cursor: `cursor` of the previous response, omit for a full sync
+    fields: Item columns to return (JSON list), defaults to DEFAULT_ITEM_FIELDS
+    limit: max rows per table, capped at MAX_ITEM_PAGE_SIZE; keep calling
+        with the new cursor while `has_more` is set
+    """
+    fields = get_item_fields(fields, extra=["modified"])
+    limit = min(frappe.utils.cint(limit) or ITEM_PAGE_SIZE, MAX_ITEM_PAGE_SIZE)
+    cursor = frappe._dict(frappe.parse_json(cursor) or {})
+
+    # Rows still inside a running transaction may carry an earlier
+    # timestamp than rows already committed, so stay a few seconds behind
+    until = frappe.utils.add_to_date(frappe.utils.now_datetime(), seconds=-ITEM_CHANGES_LAG)
+
+    def changed_since(table, columns, position):
+        modified, name = position or ("1900-01-01", "")
+        return frappe.db.sql("""
+            SELECT {columns}
+            FROM `{table}`
+            WHERE (modified > %(modified)s OR (modified = %(modified)s AND name > %(name)s))
+                AND modified <= %(until)s
+            ORDER BY modified, name
+            LIMIT %(limit)s
+        """.format(
+            columns=", ".join(f"`{column}`" for column in columns),
+            table=table
+        ), {"modified": modified, "name": name, "until": until, "limit": limit}, as_dict=True)
+
+    def deleted_since(position):
+        creation, name = position or ("1900-01-01", "")
+        return frappe.db.sql("""
+            SELECT name, deleted_doctype, deleted_name, data, creation
+            FROM `tabDeleted Document`
+            WHERE deleted_doctype IN ('Item', 'Bin')
+                AND (creation > %(creation)s OR (creation = %(creation)s AND name > %(name)s))
+                AND creation <= %(until)s
+            ORDER BY creation, name
+            LIMIT %(limit)s
+        """, {"creation": creation, "name": name, "until": until, "limit": limit}, as_dict=True)
+
+    items = changed_since("tabItem", fields, cursor.item)
+    bins = changed_since("tabBin", ["name", "item_code", "warehouse", "actual_qty", "modified"], cursor.bin)
+    deletions = deleted_since(cursor.deleted)
+
+    deleted = []
+    for row in deletions:
+        entry = {"doctype": row.deleted_doctype, "name": row.deleted_name}
+        if row.deleted_doctype == "Bin":
+            data = frappe.parse_json(row.data) or {}
+            entry.update(item_code=data.get("item_code"), warehouse=data.get("warehouse"))
+        deleted.append(entry)
+
+    return {
+        "items": items,
+        "bins": bins,
+        "deleted": deleted,
+        "cursor": {
+            "item": [str(items[-1].modified), items[-1].name] if items else cursor.item,
+            "bin": [str(bins[-1].modified), bins[-1].name] if bins else cursor.bin,
+            "deleted": [str(deletions[-1].creation), deletions[-1].name] if deletions else cursor.deleted
+        },
+        "has_more": len(items) == limit or len(bins) == limit or len(deletions) == limit
+    }
+
+
+@frappe.whitelist()
+@profiled
+def get_item_stock(warehouse=None, version=None):
+    """
+    Quantities per item served from the Redis stock snapshot, or summed
+    from Bin while the snapshot is still being built.
+    """
+    current_version = get_stock_version()
+    if version and frappe.utils.cint(version) == current_version:
+        return {
+            "status": "not_modified",
+            "version": current_version
+        }
+
+    return {
+        "stock": get_stock_snapshot(warehouse),
+        "version": current_version
+    }
+
+
+@frappe.whitelist()
+@profiled
 def get_or_create_passkit_member(customer_id):
     """
     1. Looks up customer in ERPNext
@@ -305,7 +789,8 @@ def get_or_create_passkit_member(customer_id):
     # -------------------------
     # 3️⃣ Query PassKit Member List
     # -------------------------
-    url = f"https://api.pub2.passkit.io/members/member/list/{PASSKIT_PROGRAM_ID}"
+    settings = get_passkit_settings()
+    url = f"{settings.api_url}/members/member/list/{settings.program_id}"
 
     payload = {
         "filters": {
@@ -328,12 +813,7 @@ def get_or_create_passkit_member(customer_id):
         "emailAsCsv": False
     }
 
-    headers = {
-        "Authorization": jwt_token,
-        "Content-Type": "application/json"
-    }
-
-    response = requests.post(url, headers=headers, json=payload)
+    response = passkit_request("POST", url, jwt_token, payload)
 
     # If PassKit returned a valid JSON
     try:
@@ -353,17 +833,21 @@ def get_or_create_passkit_member(customer_id):
                 "customer_name": customer.name,
                 "passkit_status": "ENROLLED"
             })
+            # Frappe does not commit GET requests by itself
+            frappe.db.commit()
         
         return {
             "status": "found",
-            "member": f'https://pub2.pskt.io/{body['result']['id']}'
+            "member": f"{settings.pass_url}/{body['result']['id']}"
         }
 
     # -------------------------
     # 5️⃣ If 200 but EMPTY → Enroll new member
     # -------------------------
     if response.status_code == 200 and not body:
-        return enroll_passkit_member_api(customer, jwt_token)
+        result = enroll_passkit_member_api(customer, jwt_token)
+        frappe.db.commit()
+        return result
 
     # -------------------------
     # 6️⃣ Other errors
@@ -377,6 +861,7 @@ def get_or_create_passkit_member(customer_id):
     
 
 @frappe.whitelist()
+@profiled
 def update_passkit_member(customer_id):
     # -------------------------
     # 1️⃣ Fetch Customer
@@ -387,6 +872,12 @@ def update_passkit_member(customer_id):
     if not mobile:
         frappe.throw("Customer has no mobile number")
 
+    # Nothing PassKit cares about changed since the last sync
+    if not passkit_member_changed(customer):
+        return {
+            "status": "unchanged"
+        }
+
     # -------------------------
     # 2️⃣ Generate PassKit JWT
     # -------------------------
@@ -395,7 +886,8 @@ def update_passkit_member(customer_id):
     # -------------------------
     # 3️⃣ Query PassKit Member List
     # -------------------------
-    url = f"https://api.pub2.passkit.io/members/member/list/{PASSKIT_PROGRAM_ID}"
+    settings = get_passkit_settings()
+    url = f"{settings.api_url}/members/member/list/{settings.program_id}"
 
     payload = {
         "filters": {
@@ -418,12 +910,7 @@ def update_passkit_member(customer_id):
         "emailAsCsv": False
     }
 
-    headers = {
-        "Authorization": jwt_token,
-        "Content-Type": "application/json"
-    }
-
-    response = requests.post(url, headers=headers, json=payload)
+    response = passkit_request("POST", url, jwt_token, payload)
 
     # If PassKit returned a valid JSON
     try:
@@ -433,7 +920,9 @@ def update_passkit_member(customer_id):
         
     
     if response.status_code == 200 and body and len(body) > 0:
-        return update_passkit_member_api(customer, jwt_token)
+        result = update_passkit_member_api(customer, jwt_token)
+        frappe.db.commit()
+        return result
     else:
         return {
             "status": "not_found"
@@ -442,7 +931,37 @@ def update_passkit_member(customer_id):
     
     
 
+def sync_passkit_member(customer_id):
+    """
+    Background job: push the customer to its enrolled PassKit member.
+    """
+    customer = frappe.get_doc("Customer", customer_id)
+    return update_passkit_member_api(customer, generate_passkit_jwt())
+
+
+def on_customer_update(doc, method):
+    """
+    Enqueue a PassKit sync only when a synced field actually changed.
+    Idle saves and customers without a Passkit Member cause no traffic.
+    """
+    member = frappe.db.get_value(
+        "Passkit Member", {"customer_name": doc.name}, ["name", "sync_hash"], as_dict=True
+    )
+    if not member or member.sync_hash == get_passkit_sync_hash(doc):
+        return
+
+    frappe.enqueue(
+        "notification_manager.notification_manager.api.sync_passkit_member",
+        queue="short",
+        job_id=f"passkit_sync::{doc.name}",
+        deduplicate=True,
+        enqueue_after_commit=True,
+        customer_id=doc.name
+    )
+
+
 @frappe.whitelist()
+@profiled
 def delete_passkit_member(customer_id):
     """
     1. Looks up customer in ERPNext
@@ -467,7 +986,8 @@ def delete_passkit_member(customer_id):
     # -------------------------
     # 3️⃣ Query PassKit Member List
     # -------------------------
-    url = f"https://api.pub2.passkit.io/members/member/list/{PASSKIT_PROGRAM_ID}"
+    settings = get_passkit_settings()
+    url = f"{settings.api_url}/members/member/list/{settings.program_id}"
 
     payload = {
         "filters": {
@@ -490,12 +1010,7 @@ def delete_passkit_member(customer_id):
         "emailAsCsv": False
     }
 
-    headers = {
-        "Authorization": jwt_token,
-        "Content-Type": "application/json"
-    }
-
-    response = requests.post(url, headers=headers, json=payload)
+    response = passkit_request("POST", url, jwt_token, payload)
 
     # If PassKit returned a valid JSON
     try:
@@ -511,6 +1026,8 @@ def delete_passkit_member(customer_id):
         exists = frappe.db.exists("Passkit Member", {"customer_name": customer.name})
         if exists:
             frappe.delete_doc("Passkit Member", exists)
+            # Frappe does not commit GET requests by itself
+            frappe.db.commit()
         
         return {
             "status": "not_found"
@@ -520,7 +1037,9 @@ def delete_passkit_member(customer_id):
     # 4️⃣ If found member → return it
     # -------------------------
     if response.status_code == 200 and body and len(body) > 0:
-        return delete_passkit_member_api(customer, jwt_token)
+        result = delete_passkit_member_api(customer, jwt_token)
+        frappe.db.commit()
+        return result
 
     # -------------------------
     # 6️⃣ Other errors
@@ -534,97 +1053,163 @@ def delete_passkit_member(customer_id):
     
     
 @frappe.whitelist()
+@profiled
 def set_passkit_point(customer_id):
     """
     1. Looks up customer in ERPNext
-    2. Calls PassKit to check if member exists
-    3. If body empty → enroll new member
+    2. Checks it is enrolled (has a Passkit Member)
+    3. Queues its current loyalty points for PassKit
+    4. flush_passkit_points pushes the latest value on the next run
     """
 
     # -------------------------
     # 1️⃣ Fetch Customer
     # -------------------------
-    customer = frappe.get_doc("Customer", customer_id)
+    customer = frappe.db.get_value(
+        "Customer",
+        customer_id,
+        ["name", "mobile_no", "phone", "custom_loyalty_points"],
+        as_dict=True
+    )
+    if not customer:
+        frappe.throw(f"Customer {customer_id} not found", frappe.DoesNotExistError)
 
     mobile = customer.mobile_no or customer.phone
     if not mobile:
         frappe.throw("Customer has no mobile number")
 
     # -------------------------
-    # 2️⃣ Generate PassKit JWT
-    # -------------------------
-    jwt_token = generate_passkit_jwt()
-
-    # -------------------------
-    # 3️⃣ Query PassKit Member List
-    # -------------------------
-    url = f"https://api.pub2.passkit.io/members/member/list/{PASSKIT_PROGRAM_ID}"
-
-    payload = {
-        "filters": {
-            "limit": 0,
-            "offset": 0,
-            "filterGroups": [
-                {
-                    "condition": "AND",
-                    "fieldFilters": [
-                        {
-                            "filterField": "mobileNumber",
-                            "filterValue": mobile,
-                            "filterOperator": "eq"
-                        }
-                    ]
-                }
-            ],
-            "orderAsc": True
-        },
-        "emailAsCsv": False
-    }
-
-    headers = {
-        "Authorization": jwt_token,
-        "Content-Type": "application/json"
-    }
-
-    response = requests.post(url, headers=headers, json=payload)
-
-    # If PassKit returned a valid JSON
-    try:
-        body = response.json()
-    except:
-        body = None
-        
-    
-    # -------------------------
-    # 5️⃣ If 200 but EMPTY → Return
+    # 2️⃣ Only enrolled members have points on PassKit
     # -------------------------
-    if response.status_code == 200 and not body:
+    if not frappe.db.exists("Passkit Member", {"customer_name": customer.name}):
         return {
             "status": "not_found"
         }
 
     # -------------------------
-    # 4️⃣ If found member → return it
+    # 3️⃣ Queue latest points
     # -------------------------
-    if response.status_code == 200 and body and len(body) > 0:
-        return set_passkit_point_api(customer, jwt_token)
+    queue_passkit_point(customer.name, customer.custom_loyalty_points)
 
-    # -------------------------
-    # 6️⃣ Other errors
-    # -------------------------
     return {
-        "status": "error",
-        "http_status": response.status_code,
-        "body": body,
-        "raw": response.text,
+        "status": "queued"
     }
     
     
+def verify_passkit_webhook_signature(raw_body):
+    """
+    Check the HMAC-SHA256 of the raw body against the signature header.
+    Without a passkit_webhook_secret no request can be verified.
+    """
+    secret = frappe.conf.passkit_webhook_secret
+    if not secret:
+        return False
+
+    signature = frappe.get_request_header("X-Passkit-Signature") or ""
+    expected = hmac.new(secret.encode(), raw_body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(signature, expected)
+
+
 @frappe.whitelist()
-def passkit_webhook(data):
-    frappe.log_error('passkit_webhook_data', data)
+@profiled
+def passkit_webhook(data=None):
+    """
+    Verify and queue the raw event, then return immediately.
+    process_passkit_webhook_events applies queued events in batches.
+    """
+    raw_body = frappe.request.get_data() if frappe.request else b""
+    if not raw_body:
+        raw_body = frappe.as_json(data).encode()
+
+    if not frappe.conf.passkit_webhook_secret:
+        frappe.throw("PassKit webhooks are disabled, no passkit_webhook_secret is configured", frappe.PermissionError)
+
+    if not verify_passkit_webhook_signature(raw_body):
+        frappe.throw("Invalid PassKit webhook signature", frappe.AuthenticationError)
+
+    frappe.cache().rpush(PASSKIT_WEBHOOK_QUEUE_KEY, raw_body)
     
     return {
         "status": "success",
         "message": "OK"
     }
+
+
+def apply_passkit_webhook_events(raw_events):
+    """
+    Fold a batch of raw events into one change per member and write
+    them to Passkit Member with one UPDATE per distinct change.
+    """
+    changes = {}
+    malformed = 0
+    received_on = frappe.utils.now()
+
+    for raw_event in raw_events:
+        try:
+            event = json.loads(raw_event)
+            if isinstance(event, dict) and "data" in event and "event" not in event:
+                event = frappe.parse_json(event["data"])
+        except (TypeError, ValueError):
+            event = None
+
+        member = (event.get("pass") or event.get("member") or {}) if isinstance(event, dict) else None
+        if (
+            not isinstance(member, dict)
+            or not isinstance(event.get("event"), (str, type(None)))
+            or not isinstance(member.get("id"), (str, type(None)))
+            or not isinstance(member.get("points"), (int, float, type(None)))
+        ):
+            # Not JSON, or not shaped like a PassKit event; skipped rather
+            # than left to fail the whole batch on every run
+            malformed += 1
+            continue
+
+        fields = PASSKIT_WEBHOOK_EVENTS.get(event.get("event"))
+        if fields is None or not member.get("id"):
+            continue
+
+        # Events are queued in arrival order, so later ones win
+        change = changes.setdefault(member["id"], {})
+        change.update(fields)
+        if member.get("points") is not None:
+            change["points"] = member["points"]
+        change["last_event_on"] = received_on
+
+    if malformed:
+        frappe.log_error('Passkit Webhook', f'Skipped {malformed} malformed event(s)')
+
+    # Members receiving the same change are updated together
+    grouped = {}
+    for passkit_id, change in changes.items():
+        grouped.setdefault(frozenset(change.items()), []).append(passkit_id)
+
+    for change, passkit_ids in grouped.items():
+        frappe.db.set_value(
+            "Passkit Member",
+            {"passkit_id": ["in", passkit_ids]},
+            dict(change),
+            update_modified=False
+        )
+
+    return len(changes)
+
+
+def process_passkit_webhook_events(batch_size=500):
+    """
+    Drain the webhook queue in batches (scheduled every minute).
+
+    A batch is trimmed from the queue only once it is committed, so a
+    failed batch is applied again on the next run; applying an event
+    twice sets the same values.
+    """
+    cache = frappe.cache()
+
+    while True:
+        raw_events = cache.lrange(PASSKIT_WEBHOOK_QUEUE_KEY, 0, batch_size - 1)
+        if not raw_events:
+            break
+
+        apply_passkit_webhook_events(raw_events)
+        frappe.db.commit()
+        # New events are only appended, so the head is still this batch
+        cache.ltrim(PASSKIT_WEBHOOK_QUEUE_KEY, len(raw_events), -1)
@@ -0,0 +1,222 @@
+import frappe
+from frappe.utils import cint, now
+
+from notification_manager.notification_manager.customer import SMS_RECEIVER_FIELDS
+from notification_manager.notification_manager.metrics import RunMetrics
+from notification_manager.notification_manager.transactions import BatchCommitter
+from notification_manager.notification_manager.utils import NotificationManager, normalize_tier
+
+DEFAULT_CAMPAIGN_BATCH_SIZE = 500
+
+CAMPAIGN_CUSTOMER_FIELDS = ["name", "customer_name", *SMS_RECEIVER_FIELDS, "loyalty_program", "loyalty_program_tier"]
+
+
+def iter_audience(filters, chunk_size=DEFAULT_CAMPAIGN_BATCH_SIZE):
+    """
+    Yield customer names matching `filters` in chunks, paginating on the
+    primary key so memory stays flat however large the audience is.
+    """
+    if isinstance(filters, dict):
+        filters = [[field, *(value if isinstance(value, (list, tuple)) else ["=", value])] for field, value in filters.items()]
+
+    last_name = ""
+    while True:
+        names = frappe.get_all(
+            "Customer",
+            filters=[*filters, ["name", ">", last_name]],
+            or_filters=[["custom_mobile_e164", "is", "set"], ["mobile_no", "is", "set"]],
+            pluck="name",
+            order_by="name asc",
+            limit=chunk_size,
+        )
+        if not names:
+            break
+
+        yield names
+        last_name = names[-1]
+
+
+@frappe.whitelist()
+def start_campaign(campaign):
+    """
+    Queue a Draft campaign; its audience is sent in background batches.
+    """
+    doc = frappe.get_doc("Notification Campaign", campaign)
+    doc.check_permission("write")
+    if doc.status != "Draft":
+        frappe.throw(f"Campaign {campaign} is already {doc.status}")
+
+    doc.db_set({
+        "status": "Queued",
+        "audience_count": 0,
+        "processed": 0,
+        "sent": 0,
+        "failed": 0,
+        "batches_queued": 0,
+        "batches_completed": 0,
+        "all_batches_queued": 0,
+        "error": None,
+    })
+    frappe.enqueue(
+        "notification_manager.notification_manager.campaigns.enqueue_campaign_batches",
+        queue="long",
+        timeout=3600,
+        job_id=f"notification_campaign::{campaign}",
+        deduplicate=True,
+        enqueue_after_commit=True,
+        campaign=campaign,
+    )
+    return {"status": "Queued"}
+
+
+@frappe.whitelist()
+def cancel_campaign(campaign):
+    """
+    Stop a campaign; batches that have not started yet are skipped.
+    """
+    frappe.has_permission("Notification Campaign", "write", campaign, throw=True)
+    frappe.db.set_value("Notification Campaign", campaign, "status", "Cancelled")
+    return {"status": "Cancelled"}
+
+
+def enqueue_campaign_batches(campaign):
+    """
+    Stream the audience and enqueue one send job per chunk; the jobs run
+    in parallel on the available workers.
+    """
+    doc = frappe.get_doc("Notification Campaign", campaign)
+    if doc.status != "Queued":
+        return
+
+    doc.db_set({"status": "Running", "started_at": now()})
+    frappe.db.commit()
+
+    try:
+        audience_filters = doc.get_audience_filters()
+        pricing_rules = save_campaign_pricing_rules(doc, audience_filters)
+        frappe.db.commit()
+
+        for names in iter_audience(audience_filters, cint(doc.batch_size) or DEFAULT_CAMPAIGN_BATCH_SIZE):
+            if frappe.db.get_value("Notification Campaign", campaign, "status") != "Running":
+                return
+
+            add_campaign_progress(campaign, audience_count=len(names), batches_queued=1)
+            frappe.enqueue(
+                "notification_manager.notification_manager.campaigns.send_campaign_batch",
+                queue="long",
+                timeout=3600,
+                campaign=campaign,
+                customer_names=names,
+                pricing_rules=pricing_rules,
+            )
+            frappe.db.commit()
+    except Exception:
+        fail_campaign(campaign)
+        raise
+
+    frappe.db.set_value("Notification Campaign", campaign, "all_batches_queued", 1)
+    complete_campaign_if_done(campaign)
+    frappe.db.commit()
+
+
+def save_campaign_pricing_rules(campaign_doc, audience_filters):
+    """
+    Save the Pricing Rule of every tier in the audience once, before the
+    batches run in parallel and race to save the same rules.
+    Returns (title, discount value, Pricing Rule) rows for the batches.
+    """
+    manager = NotificationManager()
+    rule = next((rule for rule in manager.rules if rule.name == campaign_doc.notification_rule), None)
+    if not rule:
+        return []
+
+    tiers = frappe.get_all("Customer", filters=audience_filters, pluck="loyalty_program_tier", distinct=True)
+    for tier in {normalize_tier(tier) for tier in tiers}:
+        key = manager.get_pricing_rule_key("Campaign", rule, tier)
+        manager.pricing_rules[key] = manager.save_pricing_rule(key)
+
+    return [[title, discount_value, name] for (title, discount_value), name in manager.pricing_rules.items()]
+
+
+def send_campaign_batch(campaign, customer_names, pricing_rules=None):
+    campaign_doc = frappe.get_doc("Notification Campaign", campaign)
+    if campaign_doc.status != "Running":
+        return
+
+    metrics = RunMetrics("Campaign")
+    try:
+        sent = send_campaign_customers(campaign_doc, customer_names, metrics, pricing_rules)
+    except Exception:
+        # Sends committed before the error stay; the other batches stop
+        # at their status check
+        fail_campaign(campaign)
+        raise
+
+    # Customers deleted since the audience was read count as failed
+    add_campaign_progress(
+        campaign, processed=len(customer_names), sent=sent, failed=len(customer_names) - sent, batches_completed=1
+    )
+    metrics.count("campaign_notifications", rows=len(customer_names), success=sent, failed=len(customer_names) - sent)
+    metrics.save()
+    complete_campaign_if_done(campaign)
+    frappe.db.commit()
+
+
+def send_campaign_customers(campaign_doc, customer_names, metrics, pricing_rules=None):
+    manager = NotificationManager(metrics)
+    # Saved by the enqueuer; only tiers it did not see are saved here
+    for title, discount_value, name in pricing_rules or []:
+        manager.pricing_rules[(title, discount_value)] = name
+    rule = next((rule for rule in manager.rules if rule.name == campaign_doc.notification_rule), None)
+
+    customers = frappe.get_all(
+        "Customer",
+        filters={"name": ["in", customer_names]},
+        fields=CAMPAIGN_CUSTOMER_FIELDS,
+    )
+
+    committer = BatchCommitter()
+    sent = 0
+    for customer in customers:
+        if not rule:
+            manager.log_notification(customer, "Campaign", "Failed", "No rule found")
+            continue
+        if manager.send_tier_notification(customer, "Campaign", rule=rule):
+            sent += 1
+        committer.add()
+    return sent
+
+
+def fail_campaign(campaign):
+    frappe.db.rollback()
+    frappe.db.set_value("Notification Campaign", campaign, {
+        "status": "Failed",
+        "error": frappe.get_traceback(),
+        "finished_at": now()
+    })
+    frappe.db.commit()
+
+
+def add_campaign_progress(campaign, **counts):
+    """
+    Add to the campaign counters in place, so parallel batches never
+    overwrite each other's progress.
+    """
+    assignments = ", ".join(f"`{field}` = `{field}` + %({field})s" for field in counts)
+    frappe.db.sql(f"""
+        UPDATE `tabNotification Campaign`
+        SET {assignments}
+        WHERE name = %(campaign)s
+    """, {**counts, "campaign": campaign})
+
+
+def complete_campaign_if_done(campaign):
+    # Whoever finishes last, the enqueuer or a batch, flips the status
+    frappe.db.sql("""
+        UPDATE `tabNotification Campaign`
+        SET status = 'Completed', finished_at = %(now)s
+        WHERE name = %(campaign)s
+            AND status = 'Running'
+            AND all_batches_queued = 1
+            AND batches_completed >= batches_queued
+    """, {"campaign": campaign, "now": now()})
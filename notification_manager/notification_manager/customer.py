@@ -0,0 +1,129 @@
+import re
+
+import frappe
+from frappe.custom.doctype.custom_field.custom_field import create_custom_fields
+from frappe.utils import cint
+
+DEFAULT_COUNTRY_CODE = "976"
+
+# Numbers written without a country code have this many digits (Mongolia)
+LOCAL_NUMBER_LENGTH = 8
+
+# Customer fields get_sms_receiver reads
+SMS_RECEIVER_FIELDS = ["mobile_no", "phone", "custom_mobile_e164"]
+
+CUSTOMER_FIELDS = {
+    "Customer": [
+        {
+            "fieldname": "custom_mobile_e164",
+            "label": "Mobile (E.164)",
+            "fieldtype": "Data",
+            "insert_after": "mobile_no",
+            "read_only": 1,
+            # Not unique: family members often share one number
+            "search_index": 1,
+            "no_copy": 1,
+            "description": "Normalized from Mobile No, or Phone when it is empty"
+        }
+    ]
+}
+
+
+def create_customer_fields():
+    create_custom_fields(CUSTOMER_FIELDS, update=True)
+
+
+def normalize_mobile(number, country_code=None, local_length=None):
+    """
+    E.164 form (+<country code><number>) of a phone number written in any
+    of the usual local or international styles, or None if it is not one.
+    """
+    if not number:
+        return None
+
+    country_code = country_code or frappe.conf.notification_default_country_code or DEFAULT_COUNTRY_CODE
+    local_length = cint(local_length or frappe.conf.notification_local_number_length) or LOCAL_NUMBER_LENGTH
+    number = str(number).strip()
+    digits = re.sub(r"\D", "", number)
+
+    if number.startswith("+"):
+        pass
+    elif digits.startswith("00"):
+        digits = digits[2:]
+    elif len(digits) == local_length + len(country_code) and digits.startswith(country_code):
+        pass
+    else:
+        # National format, possibly with a trunk prefix
+        digits = digits.lstrip("0")
+        if len(digits) != local_length:
+            return None
+        digits = country_code + digits
+
+    if not 8 <= len(digits) <= 15:
+        return None
+    return f"+{digits}"
+
+
+def find_customers_by_mobile(number):
+    """Customers sharing a phone number, in whatever format it is given, oldest first"""
+    normalized = normalize_mobile(number)
+    if not normalized:
+        return []
+    return frappe.get_all(
+        "Customer", filters={"custom_mobile_e164": normalized}, pluck="name", order_by="creation asc"
+    )
+
+
+@frappe.whitelist()
+def get_shared_mobiles(limit=100):
+    """
+    Numbers on more than one Customer, most shared first, to review for
+    duplicate records; family members sharing a phone show up here too.
+    """
+    frappe.has_permission("Customer", "read", throw=True)
+
+    rows = frappe.db.sql("""
+        SELECT custom_mobile_e164 AS mobile, COUNT(*) AS customer_count
+        FROM `tabCustomer`
+        WHERE custom_mobile_e164 IS NOT NULL
+        GROUP BY custom_mobile_e164
+        HAVING COUNT(*) > 1
+        ORDER BY customer_count DESC, mobile
+        LIMIT %s
+    """, cint(limit), as_dict=True)
+    if not rows:
+        return []
+
+    customers = {row.mobile: [] for row in rows}
+    for name, mobile in frappe.get_all(
+        "Customer",
+        filters={"custom_mobile_e164": ["in", list(customers)]},
+        fields=["name", "custom_mobile_e164"],
+        order_by="creation asc",
+        as_list=True
+    ):
+        customers[mobile].append(name)
+
+    for row in rows:
+        row.customers = customers[row.mobile]
+    return rows
+
+
+def set_mobile_e164(doc, method=None):
+    """
+    Keep custom_mobile_e164 in step with mobile_no / phone (Customer validate).
+    """
+    # NULL rather than "" for customers without a valid number
+    doc.custom_mobile_e164 = normalize_mobile(doc.mobile_no or doc.phone)
+
+
+def get_sms_receiver(customer):
+    """
+    Number handed to the SMS gateway: mobile_no / phone as entered, or the
+    E.164 form when notification_receiver_format is "e164" in site config.
+    Numbers normalize_mobile could not parse are still sent as entered.
+    """
+    entered = customer.get("mobile_no") or customer.get("phone")
+    if frappe.conf.notification_receiver_format == "e164":
+        return customer.get("custom_mobile_e164") or entered
+    return entered or customer.get("custom_mobile_e164")
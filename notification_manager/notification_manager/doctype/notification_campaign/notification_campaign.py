@@ -0,0 +1,39 @@
+import json
+
+import frappe
+from frappe.model.document import Document
+
+
+class NotificationCampaign(Document):
+    def validate(self):
+        if frappe.db.get_value("Notification Rule", self.notification_rule, "event_type") != "Campaign":
+            frappe.throw("Please select a Notification Rule with the Campaign event type")
+
+        if self.batch_size is not None and self.batch_size < 1:
+            frappe.throw("Batch Size must be at least 1")
+
+        self.get_audience_filters()
+
+    def get_audience_filters(self):
+        """Audience filters as a dict or list, checked against Customer"""
+        if not self.audience_filters:
+            return {}
+
+        try:
+            filters = json.loads(self.audience_filters)
+        except ValueError:
+            frappe.throw("Audience Filters must be valid JSON")
+
+        if isinstance(filters, dict):
+            fields = filters.keys()
+        elif isinstance(filters, list) and all(isinstance(f, list) and len(f) >= 3 for f in filters):
+            fields = [f[0] if len(f) == 3 else f[1] for f in filters]
+        else:
+            frappe.throw("Audience Filters must be an object or a list of [field, operator, value]")
+
+        meta = frappe.get_meta("Customer")
+        for field in fields:
+            if field != "name" and not meta.has_field(field):
+                frappe.throw(f"Customer has no field {field}")
+
+        return filters
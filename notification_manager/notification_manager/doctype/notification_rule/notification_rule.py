@@ -1,5 +1,27 @@
 import frappe
 from frappe.model.document import Document
+from frappe.utils import get_time
+
+from notification_manager.notification_manager.sms_encoding import (
+    GSM7_MULTI,
+    GSM7_SINGLE,
+    UCS2_MULTI,
+    UCS2_SINGLE,
+    count_segments,
+    to_gsm7,
+)
+
+# Only these are sent from the calendar, which is what paces sends
+PACED_EVENT_TYPES = ("Birthday", "Membership Anniversary")
+
+# Typical values, to estimate the length of a rendered message
+SAMPLE_VALUES = {
+    "discount_value": "50000.0",
+    "customer_name": "Бат-Эрдэнэ",
+    "validity_days": "30",
+    "loyalty_tier": "Platinum",
+    "coupon_code": "ABC123",
+}
 
 class NotificationRule(Document):
     def validate(self):
@@ -9,6 +31,22 @@ class NotificationRule(Document):
         if not self.tier_discounts and not self.discount_value:
             frappe.throw("Please specify either tier discounts or a default discount value")
             
+        if (self.send_window_start or self.send_window_end or self.max_per_minute) \
+                and self.event_type not in PACED_EVENT_TYPES:
+            frappe.throw(
+                f"Send windows and pacing only apply to {' and '.join(PACED_EVENT_TYPES)} rules, "
+                "please clear them"
+            )
+
+        if bool(self.send_window_start) != bool(self.send_window_end):
+            frappe.throw("Please set both the start and the end of the send window")
+
+        if self.send_window_start and get_time(self.send_window_start) >= get_time(self.send_window_end):
+            frappe.throw("Send Window End must be after Send Window Start")
+
+        if self.max_per_minute and self.max_per_minute < 0:
+            frappe.throw("Max Messages per Minute cannot be negative")
+
         # Validate message template
         required_variables = ["{customer_name}", "{coupon_code}", "{discount_value}", "{validity_days}"]
         for var in required_variables:
@@ -22,4 +60,34 @@ class NotificationRule(Document):
             for discount in self.tier_discounts:
                 if discount.loyalty_tier in tiers:
                     frappe.throw(f"Duplicate tier {discount.loyalty_tier} found")
-                tiers[discount.loyalty_tier] = discount.discount_value
\ No newline at end of file
+                tiers[discount.loyalty_tier] = discount.discount_value
+
+    def on_update(self):
+        self.warn_sms_segments()
+
+    def warn_sms_segments(self):
+        """Warn when a typical rendered message needs more than one SMS segment"""
+        message = self.message_template or ""
+        for variable, value in SAMPLE_VALUES.items():
+            message = message.replace(variable, value)
+
+        gsm7 = to_gsm7(message)
+        if self.sms_encoding == "GSM-7 Transliteration":
+            message = gsm7
+
+        sms = count_segments(message)
+        if sms.segments <= 1:
+            return
+
+        # Longest message that still fits one segment fewer
+        single, multi = (GSM7_SINGLE, GSM7_MULTI) if sms.encoding == "GSM-7" else (UCS2_SINGLE, UCS2_MULTI)
+        over = sms.length - (single if sms.segments == 2 else multi * (sms.segments - 1))
+        hint = ""
+        if sms.encoding == "UCS-2" and count_segments(gsm7).segments < sms.segments:
+            hint = f" With GSM-7 Transliteration it would take {count_segments(gsm7).segments}."
+        frappe.msgprint(
+            f"A typical message from this template is {sms.length} characters in {sms.encoding}, "
+            f"so it is sent as {sms.segments} SMS segments. Removing {over} characters saves one segment.{hint}",
+            title="SMS Length",
+            indicator="orange"
+        )
@@ -0,0 +1,17 @@
+import frappe
+from frappe.model.document import Document
+
+
+class NotificationSchedule(Document):
+    pass
+
+
+def on_doctype_update():
+    # One calendar entry per customer, event and day; the nightly job
+    # relies on it to stay idempotent when it runs twice. Declared here
+    # because fresh installs mark the patch as run without executing it.
+    frappe.db.add_unique(
+        "Notification Schedule",
+        ["customer", "event_type", "scheduled_date"],
+        constraint_name="customer_event_date"
+    )
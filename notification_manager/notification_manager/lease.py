@@ -0,0 +1,90 @@
+import threading
+
+import frappe
+
+# Extend the lease only while we still hold it
+RENEW_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# Never delete a lease that has been taken over by someone else
+RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class LeaseLostError(frappe.ValidationError):
+    pass
+
+
+class LeaseLock:
+    """
+    A Redis lease that is held by one process across all benches sharing
+    the cache. A heartbeat thread renews it every ttl/3; if the holder
+    dies the lease expires after `ttl` seconds and the next caller takes
+    over.
+
+        with LeaseLock("daily_notifications") as lease:
+            if lease.acquired:
+                ...
+                lease.ensure_held()
+    """
+
+    def __init__(self, name, ttl=60):
+        cache = frappe.cache()
+        # Resolve the key and client here; frappe.local is not available
+        # in the heartbeat thread
+        self.client = cache
+        self.key = cache.make_key(f"lease::{name}")
+        self.name = name
+        self.ttl_ms = int(ttl * 1000)
+        self.token = frappe.generate_hash(length=20)
+        self.acquired = False
+        self.lost = threading.Event()
+        self.stopped = threading.Event()
+        self.heartbeat = None
+        self.renew_script = cache.register_script(RENEW_SCRIPT)
+        self.release_script = cache.register_script(RELEASE_SCRIPT)
+
+    def acquire(self):
+        self.acquired = bool(self.client.set(self.key, self.token, nx=True, px=self.ttl_ms))
+        if self.acquired:
+            self.heartbeat = threading.Thread(target=self.renew_until_stopped, daemon=True)
+            self.heartbeat.start()
+        return self.acquired
+
+    def renew_until_stopped(self):
+        while not self.stopped.wait(self.ttl_ms / 3000):
+            try:
+                renewed = self.renew_script(keys=[self.key], args=[self.token, self.ttl_ms])
+            except Exception:
+                # A Redis blip; the lease survives until ttl, try again next beat
+                continue
+            if not renewed:
+                self.lost.set()
+                return
+
+    def ensure_held(self):
+        if self.lost.is_set():
+            raise LeaseLostError(f"Lost the {self.name} lease to another worker")
+
+    def release(self):
+        self.stopped.set()
+        if self.heartbeat:
+            self.heartbeat.join()
+        if self.acquired:
+            self.release_script(keys=[self.key], args=[self.token])
+            self.acquired = False
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
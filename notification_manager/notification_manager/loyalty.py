@@ -0,0 +1,218 @@
+from dataclasses import dataclass
+from datetime import date
+
+import frappe
+import numpy as np
+from frappe.utils import add_days, flt, getdate
+
+# Running spend per customer and program for every day with a Loyalty
+# Point Entry posted, in one scan of `tabLoyalty Point Entry`.
+#
+# A day's total counts entries with loyalty_points > 0 that are posted on
+# or before the day and expire on or after it. Every such entry is turned
+# into two events with one join against a two-row table: +amount on its
+# posting date and -amount the day after it expires. Summing the events per
+# day and taking a running SUM() OVER the days gives the total on each day.
+# The day before is that total minus the day's net amount. Like the daily
+# job, a customer is checked on every day they posted any entry.
+TIER_REPLAY_QUERY = """
+    WITH DailyNet AS (
+        SELECT
+            lpe.customer,
+            lpe.loyalty_program,
+            IF(ev.kind = 0, lpe.posting_date, DATE_ADD(lpe.expiry_date, INTERVAL 1 DAY)) AS event_date,
+            SUM(
+                CASE
+                    WHEN lpe.loyalty_points > 0 AND lpe.expiry_date >= lpe.posting_date
+                        THEN IF(ev.kind = 0, lpe.purchase_amount, -lpe.purchase_amount)
+                    ELSE 0
+                END
+            ) AS net_amount,
+            MAX(ev.kind = 0) AS has_posting
+        FROM `tabLoyalty Point Entry` lpe
+        INNER JOIN (SELECT 0 AS kind UNION ALL SELECT 1) ev
+            ON ev.kind = 0
+            OR (lpe.loyalty_points > 0 AND lpe.expiry_date >= lpe.posting_date)
+        WHERE lpe.posting_date <= %(to_date)s
+        GROUP BY lpe.customer, lpe.loyalty_program, event_date
+    ),
+    RunningTotals AS (
+        SELECT
+            customer,
+            loyalty_program,
+            event_date,
+            net_amount,
+            SUM(net_amount) OVER (
+                PARTITION BY customer, loyalty_program
+                ORDER BY event_date
+            ) AS current_total,
+            MAX(has_posting) OVER (
+                PARTITION BY customer, event_date
+            ) AS customer_posted
+        FROM DailyNet
+    )
+    SELECT
+        customer,
+        loyalty_program,
+        event_date AS posting_date,
+        current_total - net_amount AS previous_total,
+        current_total
+    FROM RunningTotals
+    WHERE customer_posted
+        AND current_total > 0
+        AND event_date BETWEEN %(from_date)s AND %(to_date)s
+    ORDER BY event_date, customer, loyalty_program
+"""
+
+
+@dataclass
+class TierChange:
+    customer: str
+    loyalty_program: str
+    posting_date: date
+    previous_tier: str
+    new_tier: str
+    previous_total: float
+    current_total: float
+
+
+def get_tier_tables():
+    """
+    Tier thresholds of every loyalty program, sorted by min_spent.
+    Loaded once per replay instead of once per customer row.
+    """
+    tiers = {}
+    for row in frappe.db.sql("""
+        SELECT parent, tier_name, min_spent
+        FROM `tabLoyalty Program Collection`
+        WHERE parenttype = 'Loyalty Program'
+        ORDER BY parent, min_spent ASC
+    """, as_dict=True):
+        tiers.setdefault(row.parent, []).append((flt(row.min_spent), row.tier_name))
+    return tiers
+
+
+def get_program_tiers(loyalty_program):
+    """
+    (min_spent, tier_name) pairs of a Loyalty Program doc, sorted by min_spent.
+    """
+    return sorted(
+        (flt(rule.min_spent), rule.tier_name) for rule in loyalty_program.collection_rules
+    )
+
+
+def classify_tiers(totals, tiers):
+    """
+    Vectorised determine_tier: one tier name per total, as a NumPy array.
+
+    searchsorted(side="left") returns the first threshold that is >= the
+    total, which is exactly the first tier with total <= min_spent; totals
+    above every threshold land past the end, on "Classic".
+    """
+    thresholds = np.array([min_spent for min_spent, _ in tiers], dtype=float)
+    names = np.array([tier_name for _, tier_name in tiers] + ["Classic"], dtype=object)
+    return names[np.searchsorted(thresholds, np.asarray(totals, dtype=float), side="left")]
+
+
+def determine_tier(total_spent, tiers):
+    """
+    First tier whose min_spent is not below the total, else "Classic"
+    (same rule as the daily notification job).
+    """
+    for min_spent, tier_name in tiers:
+        if flt(total_spent) <= min_spent:
+            return tier_name
+    return "Classic"
+
+
+def iter_tier_changes(from_date, to_date):
+    """
+    Yield a TierChange for every tier crossing between the two dates,
+    in posting date order.
+
+    The whole range is computed by a single TIER_REPLAY_QUERY, so a month
+    costs about the same as one day. Rows are streamed through an
+    unbuffered (server-side) cursor and memory stays flat. The connection
+    is busy until the generator is exhausted: consumers must not run
+    queries of their own between items.
+    """
+    tier_tables = get_tier_tables()
+
+    with frappe.db.unbuffered_cursor():
+        rows = frappe.db.sql(
+            TIER_REPLAY_QUERY,
+            {"from_date": getdate(from_date), "to_date": getdate(to_date)},
+            as_dict=True,
+            as_iterator=True
+        )
+        for row in rows:
+            tiers = tier_tables.get(row.loyalty_program, [])
+            previous_tier = determine_tier(row.previous_total, tiers)
+            new_tier = determine_tier(row.current_total, tiers)
+
+            if new_tier != previous_tier:
+                yield TierChange(
+                    customer=row.customer,
+                    loyalty_program=row.loyalty_program,
+                    posting_date=getdate(row.posting_date),
+                    previous_tier=previous_tier,
+                    new_tier=new_tier,
+                    previous_total=flt(row.previous_total),
+                    current_total=flt(row.current_total)
+                )
+
+
+@dataclass
+class BulkTiers:
+    customer: np.ndarray
+    loyalty_program: np.ndarray
+    previous_total: np.ndarray
+    current_total: np.ndarray
+    previous_tier: np.ndarray
+    new_tier: np.ndarray
+
+    def changed(self):
+        """
+        Boolean mask of customers whose tier differs between the two dates.
+        """
+        return self.previous_tier != self.new_tier
+
+
+def get_bulk_tiers(as_of, previous_as_of=None):
+    """
+    Previous and new tier of every customer with loyalty spend, at once.
+
+    Totals for both dates come from one aggregate query into NumPy arrays
+    and each program is classified with a single searchsorted call, so a
+    re-tiering of the whole customer base takes seconds.
+    """
+    as_of = getdate(as_of)
+    previous_as_of = getdate(previous_as_of) if previous_as_of else add_days(as_of, -1)
+
+    rows = frappe.db.sql("""
+        SELECT
+            customer,
+            loyalty_program,
+            SUM(IF(posting_date <= %(previous)s AND expiry_date >= %(previous)s, purchase_amount, 0)),
+            SUM(IF(posting_date <= %(current)s AND expiry_date >= %(current)s, purchase_amount, 0))
+        FROM `tabLoyalty Point Entry`
+        WHERE loyalty_points > 0
+            AND posting_date <= GREATEST(%(previous)s, %(current)s)
+            AND expiry_date >= LEAST(%(previous)s, %(current)s)
+        GROUP BY customer, loyalty_program
+    """, {"previous": previous_as_of, "current": as_of})
+
+    customer = np.array([row[0] for row in rows], dtype=object)
+    loyalty_program = np.array([row[1] for row in rows], dtype=object)
+    previous_total = np.array([row[2] or 0 for row in rows], dtype=float)
+    current_total = np.array([row[3] or 0 for row in rows], dtype=float)
+    previous_tier = np.full(len(rows), "Classic", dtype=object)
+    new_tier = np.full(len(rows), "Classic", dtype=object)
+
+    for program, tiers in get_tier_tables().items():
+        mask = loyalty_program == program
+        if mask.any():
+            previous_tier[mask] = classify_tiers(previous_total[mask], tiers)
+            new_tier[mask] = classify_tiers(current_total[mask], tiers)
+
+    return BulkTiers(customer, loyalty_program, previous_total, current_total, previous_tier, new_tier)
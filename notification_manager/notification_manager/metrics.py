@@ -0,0 +1,134 @@
+import time
+from contextlib import contextmanager
+
+import frappe
+from werkzeug.wrappers import Response
+
+STAGE_FIELDS = ("calls", "duration", "rows", "success", "failed")
+
+
+class RunMetrics:
+    """
+    Per-stage durations and counters of one notification run,
+    persisted as a Notification Run.
+    """
+
+    def __init__(self, run_type):
+        self.run_type = run_type
+        self.started_at = frappe.utils.now_datetime()
+        self.start = time.perf_counter()
+        self.stages = {}
+
+    def get_stage(self, name):
+        if name not in self.stages:
+            self.stages[name] = frappe._dict({field: 0 for field in STAGE_FIELDS})
+        return self.stages[name]
+
+    @contextmanager
+    def stage(self, name, rows=0):
+        """
+        Time a block; it counts as a success unless it raises.
+        The yielded stage can be used to add rows found inside the block.
+        """
+        stage = self.get_stage(name)
+        stage.rows += rows
+        start = time.perf_counter()
+        try:
+            yield stage
+        except Exception:
+            stage.failed += 1
+            raise
+        else:
+            stage.success += 1
+        finally:
+            stage.calls += 1
+            stage.duration += time.perf_counter() - start
+
+    def count(self, name, rows=0, success=0, failed=0):
+        stage = self.get_stage(name)
+        stage.rows += rows
+        stage.success += success
+        stage.failed += failed
+
+    def save(self, status="Success", error=None):
+        return frappe.get_doc({
+            "doctype": "Notification Run",
+            "run_type": self.run_type,
+            "status": status,
+            "started_at": self.started_at,
+            "finished_at": frappe.utils.now_datetime(),
+            "duration": time.perf_counter() - self.start,
+            "error": error,
+            "stages": [{"stage": name, **stage} for name, stage in self.stages.items()]
+        }).insert(ignore_permissions=True)
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(**labels):
+    return ",".join(f'{key}="{escape_label(value)}"' for key, value in labels.items())
+
+
+@frappe.whitelist()
+def get_notification_metrics():
+    """
+    Latest Notification Run of every run type, in Prometheus text format.
+    """
+    frappe.only_for("System Manager")
+
+    runs = frappe.db.sql("""
+        SELECT nr.name, nr.run_type, nr.status, nr.duration, nr.finished_at
+        FROM `tabNotification Run` nr
+        INNER JOIN (
+            SELECT run_type, MAX(creation) AS creation
+            FROM `tabNotification Run`
+            GROUP BY run_type
+        ) latest ON latest.run_type = nr.run_type AND latest.creation = nr.creation
+    """, as_dict=True)
+
+    stages = frappe.get_all(
+        "Notification Run Stage",
+        filters={"parent": ["in", [run.name for run in runs] or [""]], "parenttype": "Notification Run"},
+        fields=["parent", "stage", *STAGE_FIELDS]
+    )
+    run_types = {run.name: run.run_type for run in runs}
+
+    lines = [
+        "# HELP notification_run_duration_seconds Duration of the last run.",
+        "# TYPE notification_run_duration_seconds gauge",
+    ]
+    lines += [f"notification_run_duration_seconds{{{format_labels(run_type=run.run_type)}}} {run.duration or 0}" for run in runs]
+
+    lines += [
+        "# HELP notification_run_success Whether the last run succeeded.",
+        "# TYPE notification_run_success gauge",
+    ]
+    lines += [f"notification_run_success{{{format_labels(run_type=run.run_type)}}} {int(run.status == 'Success')}" for run in runs]
+
+    lines += [
+        "# HELP notification_run_finished_timestamp_seconds When the last run finished.",
+        "# TYPE notification_run_finished_timestamp_seconds gauge",
+    ]
+    lines += [
+        f"notification_run_finished_timestamp_seconds{{{format_labels(run_type=run.run_type)}}} "
+        f"{frappe.utils.get_datetime(run.finished_at).timestamp() if run.finished_at else 0}"
+        for run in runs
+    ]
+
+    for field, help_text in (
+        ("duration", "Time spent in the stage during the last run, in seconds."),
+        ("calls", "Times the stage ran during the last run."),
+        ("rows", "Rows handled by the stage during the last run."),
+        ("success", "Successful calls of the stage during the last run."),
+        ("failed", "Failed calls of the stage during the last run."),
+    ):
+        metric = f"notification_stage_{field}{'_seconds' if field == 'duration' else ''}"
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} gauge"]
+        lines += [
+            f"{metric}{{{format_labels(run_type=run_types[stage.parent], stage=stage.stage)}}} {stage[field] or 0}"
+            for stage in stages
+        ]
+
+    return Response("\n".join(lines) + "\n", content_type="text/plain; version=0.0.4")
@@ -0,0 +1,191 @@
+import cProfile
+import functools
+import io
+import marshal
+import pickle
+import pstats
+import time
+
+import frappe
+import requests
+from frappe.core.doctype.sms_settings.sms_settings import send_sms
+from werkzeug.wrappers import Response
+
+# Redis list of the latest profiles, newest first
+PROFILE_RING_KEY = "notification_profiles"
+PROFILE_RING_SIZE = 50
+
+# Send this header (as a System Manager) to profile a single request
+PROFILE_HEADER = "X-Notification-Profile"
+
+PROFILE_TOP_FUNCTIONS = 25
+
+
+def profiling_requested():
+    """
+    Profile when the site enables notification_profiling, or when a
+    System Manager sends the profiling header with the request.
+    """
+    if frappe.conf.notification_profiling:
+        return True
+
+    request = getattr(frappe.local, "request", None)
+    if request is None or not request.headers.get(PROFILE_HEADER):
+        return False
+    return "System Manager" in frappe.get_roles()
+
+
+def get_query_count():
+    """
+    Statements sent on this connection so far (MariaDB only).
+    """
+    if frappe.db.db_type != "mariadb":
+        return None
+    row = frappe.db.sql("SHOW SESSION STATUS LIKE 'Questions'")
+    return int(row[0][1]) if row else None
+
+
+def record_http_call(method, url, status, duration):
+    """
+    Note an outbound HTTP call on the running profile, if any.
+    """
+    profile = getattr(frappe.local, "notification_profile", None)
+    if profile is not None:
+        profile.http.append({"method": method, "url": url, "status": status, "duration": round(duration, 4)})
+
+
+def timed_send_sms(receiver_list, msg, success_msg=True):
+    """
+    send_sms, noted on the running profile as a call to the SMS gateway.
+    """
+    if getattr(frappe.local, "notification_profile", None) is None:
+        return send_sms(receiver_list=receiver_list, msg=msg, success_msg=success_msg)
+
+    settings = frappe.get_cached_doc("SMS Settings")
+    method = "POST" if settings.use_post else "GET"
+    start = time.perf_counter()
+    # send_sms raises for any response that is not 2xx
+    status = 200
+    try:
+        return send_sms(receiver_list=receiver_list, msg=msg, success_msg=success_msg)
+    except requests.HTTPError as e:
+        status = e.response.status_code if e.response is not None else None
+        raise
+    except Exception:
+        status = None
+        raise
+    finally:
+        record_http_call(method, settings.sms_gateway_url, status, time.perf_counter() - start)
+
+
+def profiled(fn):
+    """
+    Run fn under cProfile when profiling_requested(); nested profiled
+    calls are part of the outer profile.
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if getattr(frappe.local, "notification_profile", None) is not None or not profiling_requested():
+            return fn(*args, **kwargs)
+        return run_profiled(fn, args, kwargs)
+
+    return wrapper
+
+
+def run_profiled(fn, args, kwargs):
+    profile = frappe.local.notification_profile = frappe._dict(http=[])
+    queries_before = get_query_count()
+    profiler = cProfile.Profile()
+    started_at = frappe.utils.now()
+    start = time.perf_counter()
+    status = "Success"
+    try:
+        return profiler.runcall(fn, *args, **kwargs)
+    except Exception:
+        status = "Failed"
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        frappe.local.notification_profile = None
+        try:
+            queries_after = get_query_count()
+            save_profile(
+                method=f"{fn.__module__}.{fn.__qualname__}",
+                started_at=started_at,
+                duration=duration,
+                status=status,
+                # The closing SHOW STATUS counts itself
+                sql_queries=queries_after - queries_before - 1 if queries_before is not None else None,
+                http=profile.http,
+                profiler=profiler,
+            )
+        except Exception:
+            frappe.log_error("Could not save notification profile")
+
+
+def get_top_functions(profiler, limit=PROFILE_TOP_FUNCTIONS):
+    output = io.StringIO()
+    pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(limit)
+    return output.getvalue()
+
+
+def save_profile(method, started_at, duration, status, sql_queries, http, profiler):
+    profiler.create_stats()
+    entry = {
+        "id": frappe.generate_hash(length=12),
+        "method": method,
+        "user": frappe.session.user if getattr(frappe.local, "session", None) else None,
+        "started_at": started_at,
+        "duration": round(duration, 4),
+        "status": status,
+        "sql_queries": sql_queries,
+        "http_calls": len(http),
+        "http_duration": round(sum(call["duration"] for call in http), 4),
+        "http": http,
+        "top": get_top_functions(profiler),
+        # Same format as cProfile's dump_stats, readable by pstats and snakeviz
+        "stats": marshal.dumps(profiler.stats),
+    }
+
+    cache = frappe.cache()
+    key = cache.make_key(PROFILE_RING_KEY)
+    size = frappe.conf.notification_profile_ring_size or PROFILE_RING_SIZE
+
+    pipe = cache.pipeline()
+    pipe.lpush(key, pickle.dumps(entry))
+    pipe.ltrim(key, 0, size - 1)
+    pipe.execute()
+    return entry["id"]
+
+
+def get_profile_entries():
+    cache = frappe.cache()
+    return [pickle.loads(raw) for raw in cache.lrange(PROFILE_RING_KEY, 0, -1)]
+
+
+@frappe.whitelist()
+def get_profiles():
+    """
+    Stored profiles, newest first, without the raw stats.
+    """
+    frappe.only_for("System Manager")
+    return [{k: v for k, v in entry.items() if k != "stats"} for entry in get_profile_entries()]
+
+
+@frappe.whitelist()
+def download_profile(profile_id):
+    """
+    A stored profile as a .prof file, readable with pstats or snakeviz.
+    """
+    frappe.only_for("System Manager")
+
+    entry = next((entry for entry in get_profile_entries() if entry["id"] == profile_id), None)
+    if not entry:
+        frappe.throw(f"Profile {profile_id} not found", frappe.DoesNotExistError)
+
+    filename = f"{entry['method'].rsplit('.', 1)[-1]}-{profile_id}.prof"
+    return Response(
+        entry["stats"],
+        content_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
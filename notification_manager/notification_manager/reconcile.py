@@ -0,0 +1,231 @@
+import json
+
+import frappe
+
+from notification_manager.notification_manager.api import (
+    generate_passkit_jwt,
+    get_passkit_settings,
+    passkit_request,
+    queue_passkit_point,
+)
+from notification_manager.notification_manager.profiling import profiled
+from notification_manager.notification_manager.transactions import BatchCommitter
+
+PASSKIT_RECONCILE_PAGE_SIZE = 500
+
+# Last reconciliation report, kept in Redis for a week
+PASSKIT_RECONCILE_REPORT_KEY = "passkit_reconcile_report"
+
+# Redis set of PassKit ids seen during the running reconciliation
+PASSKIT_RECONCILE_SEEN_KEY = "passkit_reconcile_seen"
+
+# Only this many example names are kept per category in the report
+REPORT_SAMPLE_SIZE = 100
+
+
+def iter_passkit_members(jwt_token, page_size=PASSKIT_RECONCILE_PAGE_SIZE):
+    """
+    Yield every member of the program, one page in memory at a time.
+    The list endpoint streams one {"result": member} JSON object per line.
+    """
+    settings = get_passkit_settings()
+    url = f"{settings.api_url}/members/member/list/{settings.program_id}"
+    offset = 0
+
+    while True:
+        payload = {
+            "filters": {
+                "limit": page_size,
+                "offset": offset,
+                "orderAsc": True
+            },
+            "emailAsCsv": False
+        }
+
+        response = passkit_request("POST", url, jwt_token, payload, stream=True)
+        if response.status_code != 200:
+            frappe.throw(f"PassKit member list failed with {response.status_code}: {response.text}")
+
+        count = 0
+        for line in response.iter_lines():
+            if not line:
+                continue
+            member = json.loads(line).get("result")
+            if member:
+                count += 1
+                yield member
+
+        if count < page_size:
+            break
+        offset += page_size
+
+
+def iter_pages(iterable, size):
+    page = []
+    for item in iterable:
+        page.append(item)
+        if len(page) >= size:
+            yield page
+            page = []
+    if page:
+        yield page
+
+
+class PassKitReconciler:
+    """
+    Compare PassKit membership with Passkit Member and Customer.
+
+    PassKit is paged through once and every page is checked against
+    ERPNext with two queries. Seen PassKit ids go to a Redis set, so
+    local members missing in PassKit can be found afterwards without
+    holding the whole program in memory.
+    """
+
+    def __init__(self, repair=False):
+        self.repair = repair
+        self.report = {
+            "started_on": frappe.utils.now(),
+            "checked": 0,
+            "repaired": 0,
+        }
+        for category in ("missing", "orphaned_passkit", "orphaned_local", "points_mismatch"):
+            self.report[category] = {"count": 0, "sample": []}
+
+        self.cache = frappe.cache()
+        self.seen_key = self.cache.make_key(PASSKIT_RECONCILE_SEEN_KEY)
+
+    def add(self, category, entry):
+        self.report[category]["count"] += 1
+        if len(self.report[category]["sample"]) < REPORT_SAMPLE_SIZE:
+            self.report[category]["sample"].append(entry)
+
+    def run(self):
+        self.cache.delete(self.seen_key)
+        try:
+            jwt_token = generate_passkit_jwt()
+            committer = BatchCommitter()
+            for page in iter_pages(iter_passkit_members(jwt_token), PASSKIT_RECONCILE_PAGE_SIZE):
+                self.check_page(page)
+                if self.repair:
+                    committer.add(len(page))
+
+            self.check_local_members()
+            if self.repair:
+                frappe.db.commit()
+        finally:
+            self.cache.delete(self.seen_key)
+
+        self.report["finished_on"] = frappe.utils.now()
+        frappe.cache().set_value(PASSKIT_RECONCILE_REPORT_KEY, self.report, expires_in_sec=7 * 24 * 3600)
+        return self.report
+
+    def check_page(self, page):
+        self.cache.sadd(PASSKIT_RECONCILE_SEEN_KEY, *[member["id"] for member in page])
+
+        external_ids = [member.get("externalId") for member in page if member.get("externalId")]
+        customers = {
+            row.name: row
+            for row in frappe.get_all(
+                "Customer",
+                filters={"name": ["in", external_ids]},
+                fields=["name", "custom_loyalty_points"]
+            )
+        } if external_ids else {}
+        local_members = set(
+            frappe.get_all(
+                "Passkit Member",
+                filters={"customer_name": ["in", external_ids]},
+                pluck="customer_name"
+            )
+        ) if external_ids else set()
+
+        for member in page:
+            self.report["checked"] += 1
+            customer = customers.get(member.get("externalId"))
+
+            if not customer:
+                self.add("orphaned_passkit", member["id"])
+                continue
+
+            if customer.name not in local_members:
+                self.add("missing", customer.name)
+                if self.repair:
+                    frappe.get_doc({
+                        "doctype": "Passkit Member",
+                        "passkit_id": member["id"],
+                        "customer_name": customer.name,
+                        "passkit_status": member.get("status") or "ENROLLED",
+                        "points": member.get("points")
+                    }).insert(ignore_permissions=True)
+                    self.report["repaired"] += 1
+
+            if frappe.utils.flt(member.get("points")) != frappe.utils.flt(customer.custom_loyalty_points):
+                self.add("points_mismatch", customer.name)
+                if self.repair:
+                    # ERPNext is the source of truth for loyalty points
+                    queue_passkit_point(customer.name, customer.custom_loyalty_points)
+                    self.report["repaired"] += 1
+
+    def check_local_members(self):
+        """
+        Walk Passkit Member by name (keyset) and look up each page of
+        PassKit ids in the seen set with one pipelined round trip.
+        """
+        last_name = ""
+        while True:
+            members = frappe.get_all(
+                "Passkit Member",
+                filters={"name": [">", last_name]},
+                fields=["name", "passkit_id", "customer_name"],
+                order_by="name asc",
+                limit=PASSKIT_RECONCILE_PAGE_SIZE
+            )
+            if not members:
+                break
+            last_name = members[-1].name
+
+            pipe = self.cache.pipeline()
+            for member in members:
+                pipe.sismember(self.seen_key, member.passkit_id or "")
+            seen = pipe.execute()
+
+            for member, found in zip(members, seen, strict=True):
+                if found:
+                    continue
+                self.add("orphaned_local", member.customer_name)
+                if self.repair:
+                    frappe.delete_doc("Passkit Member", member.name, ignore_permissions=True)
+                    self.report["repaired"] += 1
+
+
+def run_passkit_reconciliation(repair=False):
+    return PassKitReconciler(repair=repair).run()
+
+
+@frappe.whitelist()
+@profiled
+def reconcile_passkit_members(repair=0):
+    """
+    Start a reconciliation in the background.
+    With repair, missing Passkit Member records are created, local
+    orphans are deleted and ERPNext points are queued for PassKit.
+    """
+    frappe.only_for("System Manager")
+    frappe.enqueue(
+        "notification_manager.notification_manager.reconcile.run_passkit_reconciliation",
+        queue="long",
+        timeout=3600,
+        job_id="passkit_reconciliation",
+        deduplicate=True,
+        repair=frappe.utils.cint(repair)
+    )
+    return {
+        "status": "queued"
+    }
+
+
+@frappe.whitelist()
+@profiled
+def get_passkit_reconciliation_report():
+    frappe.only_for("System Manager")
+    return frappe.cache().get_value(PASSKIT_RECONCILE_REPORT_KEY)
@@ -0,0 +1,134 @@
+import random
+from datetime import timedelta
+
+import frappe
+import requests
+from frappe.utils import cint, now, now_datetime
+
+from notification_manager.notification_manager.customer import SMS_RECEIVER_FIELDS, get_sms_receiver
+from notification_manager.notification_manager.lease import LeaseLock
+from notification_manager.notification_manager.metrics import RunMetrics
+from notification_manager.notification_manager.profiling import timed_send_sms
+from notification_manager.notification_manager.transactions import BatchCommitter
+
+REDRIVE_LEASE = "notification_redrive"
+REDRIVE_BATCH_SIZE = 200
+
+RETRY_BASE_SECONDS = 60
+RETRY_MAX_SECONDS = 6 * 60 * 60
+RETRY_MAX_ATTEMPTS = 5
+
+
+def is_retryable_send_error(error):
+    """
+    Gateway timeouts, connection errors, 429 and 5xx heal by themselves;
+    anything else (bad number, missing SMS Settings, ...) will not.
+    """
+    if isinstance(error, (requests.Timeout, requests.ConnectionError)):
+        return True
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return False
+
+
+def get_retry_fields(attempts):
+    """
+    Notification Log fields for a failure after `attempts` sends: the next
+    try is due after a jittered exponential backoff, or never once the
+    attempt cap is reached.
+    """
+    max_attempts = cint(frappe.conf.notification_retry_max_attempts) or RETRY_MAX_ATTEMPTS
+    if attempts >= max_attempts:
+        return {"retryable": 0, "attempts": attempts, "next_retry_at": None}
+
+    base = cint(frappe.conf.notification_retry_base_seconds) or RETRY_BASE_SECONDS
+    delay = min(base * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+    return {
+        "retryable": 1,
+        "attempts": attempts,
+        "next_retry_at": now_datetime() + timedelta(seconds=random.uniform(delay / 2, delay)),
+    }
+
+
+def redrive_failed_notifications(batch_size=REDRIVE_BATCH_SIZE):
+    """
+    Resend retryable failed notifications whose backoff has passed
+    (scheduled every minute). The stored message, and so the coupon
+    already issued, is sent again as is.
+    """
+    filters = {"retryable": 1, "next_retry_at": ["<=", now()]}
+    if not frappe.db.exists("Notification Log", filters):
+        return
+
+    with LeaseLock(REDRIVE_LEASE, ttl=frappe.conf.notification_lease_ttl or 60) as lease:
+        if not lease.acquired:
+            return
+
+        logs = frappe.get_all(
+            "Notification Log",
+            filters=filters,
+            fields=["name", "customer", "sms_message", "attempts"],
+            order_by="next_retry_at asc",
+            limit=batch_size
+        )
+        mobiles = {
+            customer.name: get_sms_receiver(customer)
+            for customer in frappe.get_all(
+                "Customer",
+                filters={"name": ["in", list({log.customer for log in logs})]},
+                fields=["name", *SMS_RECEIVER_FIELDS]
+            )
+        }
+
+        metrics = RunMetrics("Redrive")
+        committer = BatchCommitter()
+        try:
+            for log in logs:
+                lease.ensure_held()
+                sent = redrive_notification(log, mobiles.get(log.customer), metrics)
+                metrics.count("redriven_notifications", rows=1, success=int(sent), failed=int(not sent))
+                committer.add()
+        except Exception:
+            # Logs updated since the last batch were resent already; rolling
+            # them back would resend them on the next run
+            metrics.save("Failed", frappe.get_traceback())
+            frappe.db.commit()
+            raise
+
+        metrics.save()
+        frappe.db.commit()
+
+
+def redrive_notification(log, mobile_no, metrics):
+    attempts = cint(log.attempts) + 1
+
+    if not mobile_no or not log.sms_message:
+        frappe.db.set_value("Notification Log", log.name, {
+            "retryable": 0,
+            "next_retry_at": None,
+            "message": "No mobile number" if not mobile_no else "No message to resend"
+        })
+        return False
+
+    try:
+        with metrics.stage("send_sms"):
+            timed_send_sms(
+                receiver_list=[mobile_no],
+                msg=log.sms_message,
+                success_msg=False
+            )
+    except Exception as e:
+        retry = get_retry_fields(attempts) if is_retryable_send_error(e) else {
+            "retryable": 0, "attempts": attempts, "next_retry_at": None
+        }
+        frappe.db.set_value("Notification Log", log.name, {**retry, "message": str(e)})
+        return False
+
+    frappe.db.set_value("Notification Log", log.name, {
+        "status": "Success",
+        "retryable": 0,
+        "attempts": attempts,
+        "next_retry_at": None,
+        "message": f"Sent on attempt {attempts}"
+    })
+    return True
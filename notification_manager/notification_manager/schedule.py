@@ -0,0 +1,314 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import frappe
+from frappe.utils import add_days, cint, get_time, getdate, now, now_datetime, today
+
+from notification_manager.notification_manager.customer import get_sms_receiver
+from notification_manager.notification_manager.lease import LeaseLock
+from notification_manager.notification_manager.metrics import RunMetrics
+from notification_manager.notification_manager.profiling import timed_send_sms
+from notification_manager.notification_manager.redrive import is_retryable_send_error
+from notification_manager.notification_manager.sms_encoding import count_segments
+from notification_manager.notification_manager.transactions import BatchCommitter, savepoint
+from notification_manager.notification_manager.utils import CUSTOMER_SAVEPOINT, NotificationManager
+
+SCHEDULE_DAYS = 7
+
+SCHEDULE_LEASE = "notification_schedule"
+
+DISPATCH_LEASE = "notification_dispatch"
+
+# Due entries one dispatcher tick sends for rules spread evenly over
+# their window; paced rules add their max_per_minute on top
+DISPATCH_LIMIT = 2000
+
+SCHEDULE_ENTRY_FIELDS = [
+    "name", "customer", "event_type", "status", "notification_rule", "scheduled_at", "loyalty_program",
+    "loyalty_tier", "discount_value", "coupon", "mobile_no", "message"
+]
+
+
+def prepare_notification_schedule(days=SCHEDULE_DAYS):
+    """
+    Fill the Notification Schedule for the coming days (scheduled nightly)
+    so the morning run only has to dispatch.
+    """
+    with LeaseLock(SCHEDULE_LEASE, ttl=frappe.conf.notification_lease_ttl or 60) as lease:
+        if not lease.acquired:
+            return
+
+        metrics = RunMetrics("Schedule Preparation")
+        try:
+            run_schedule_preparation(metrics, days, lease)
+            lease.ensure_held()
+        except Exception:
+            frappe.db.rollback()
+            metrics.save("Failed", frappe.get_traceback())
+            frappe.db.commit()
+            raise
+
+        metrics.save()
+        frappe.db.commit()
+
+
+def run_schedule_preparation(metrics, days, lease=None):
+    start = getdate(today())
+    dates = {add_days(start, offset).strftime("%m-%d"): add_days(start, offset) for offset in range(days)}
+
+    # One pass over Customer for every day and both events; month-day
+    # matching cannot use a date index, so do it once, off-peak
+    with metrics.stage("calendar_query") as stage:
+        customers = frappe.db.sql("""
+            SELECT name, customer_name, mobile_no, phone, custom_mobile_e164, loyalty_program,
+                loyalty_program_tier, custom_birthday, custom_member_date
+            FROM `tabCustomer`
+            WHERE (custom_mobile_e164 IS NOT NULL OR mobile_no != '')
+                AND (
+                    DATE_FORMAT(custom_birthday, '%%m-%%d') IN %(days)s
+                    OR DATE_FORMAT(custom_member_date, '%%m-%%d') IN %(days)s
+                )
+        """, {"days": list(dates)}, as_dict=True)
+        stage.rows += len(customers)
+
+    existing = set(frappe.db.sql("""
+        SELECT customer, event_type, scheduled_date
+        FROM `tabNotification Schedule`
+        WHERE scheduled_date BETWEEN %s AND %s
+    """, (start, add_days(start, days - 1))))
+
+    manager = NotificationManager(metrics)
+    committer = BatchCommitter()
+
+    for customer in customers:
+        if lease:
+            lease.ensure_held()
+
+        events = []
+        if customer.custom_birthday:
+            birthday = dates.get(customer.custom_birthday.strftime("%m-%d"))
+            if birthday:
+                events.append(("Birthday", birthday))
+        if customer.custom_member_date:
+            anniversary = dates.get(customer.custom_member_date.strftime("%m-%d"))
+            # Members who joined this year have no anniversary yet
+            if anniversary and anniversary.year != customer.custom_member_date.year:
+                events.append(("Membership Anniversary", anniversary))
+
+        for event_type, scheduled_date in events:
+            if (customer.name, event_type, scheduled_date) in existing:
+                continue
+            scheduled = schedule_notification(manager, customer, event_type, scheduled_date)
+            metrics.count("scheduled_notifications", rows=1, success=int(scheduled), failed=int(not scheduled))
+            committer.add()
+
+
+def schedule_notification(manager, customer, event_type, scheduled_date):
+    """
+    Mint the coupon and render the message now, like the morning run
+    would: birthdays get a tier coupon, anniversaries the plain template.
+    """
+    rule = manager.get_rule(event_type)
+    if not rule:
+        return False
+
+    try:
+        with savepoint(CUSTOMER_SAVEPOINT):
+            if event_type == "Birthday":
+                prepared = manager.prepare_tier_notification(customer, event_type, rule, valid_from=scheduled_date)
+            else:
+                prepared = frappe._dict(message=manager.render_sms(rule, rule.message_template))
+
+            frappe.get_doc({
+                "doctype": "Notification Schedule",
+                "customer": customer.name,
+                "event_type": event_type,
+                "scheduled_date": scheduled_date,
+                "status": "Pending",
+                "notification_rule": rule.name,
+                "loyalty_program": customer.loyalty_program,
+                "loyalty_tier": prepared.loyalty_tier,
+                "discount_value": prepared.discount_value,
+                "coupon": prepared.coupon,
+                "mobile_no": get_sms_receiver(customer),
+                "message": prepared.message
+            }).insert(ignore_permissions=True)
+
+            if prepared.pricing_rule_key:
+                manager.pricing_rules[prepared.pricing_rule_key] = prepared.pricing_rule
+        return True
+
+    except Exception as e:
+        frappe.log_error(
+            title='Error occurred in notification scheduling.',
+            message=f"""
+            Method: schedule_notification
+            Error: {e}
+            Customer: {customer.name}
+            Event Type: {event_type}
+            """,
+            reference_doctype="Notification Schedule"
+        )
+        return False
+
+
+def dispatch_scheduled_notifications(manager, metrics, on_date, lease=None, committer=None):
+    """
+    Send the pre-rendered calendar entries of `on_date`; entries of rules
+    with a send window are given slots for dispatch_due_notifications.
+    Returns {event_type: customers handled} so live discovery skips them.
+    """
+    committer = committer or BatchCommitter()
+    handled = defaultdict(set)
+    rules = {rule.name: rule for rule in manager.rules}
+
+    with metrics.stage("schedule_query") as stage:
+        entries = frappe.get_all(
+            "Notification Schedule",
+            filters={"scheduled_date": on_date},
+            fields=SCHEDULE_ENTRY_FIELDS,
+            order_by="name asc"
+        )
+        stage.rows += len(entries)
+
+    windowed = defaultdict(list)
+    for entry in entries:
+        handled[entry.event_type].add(entry.customer)
+        if entry.status != "Pending" or entry.scheduled_at:
+            continue
+
+        rule = rules.get(entry.notification_rule)
+        if rule and rule.send_window_start and rule.send_window_end:
+            windowed[rule.name].append(entry)
+            continue
+
+        if lease:
+            lease.ensure_held()
+        sent = deliver_scheduled_notification(manager, entry)
+        count_delivery(metrics, entry, sent)
+        committer.add()
+
+    with metrics.stage("slot_assignment") as stage:
+        for rule_name, rule_entries in windowed.items():
+            assign_send_slots(rule_entries, rules[rule_name], on_date)
+            stage.rows += len(rule_entries)
+
+    return handled
+
+
+def count_delivery(metrics, entry, sent):
+    counter = "birthday_notifications" if entry.event_type == "Birthday" else "anniversary_notifications"
+    metrics.count(counter, rows=1, success=int(sent), failed=int(not sent))
+
+
+def assign_send_slots(entries, rule, on_date):
+    """
+    Spread entries over the rule's send window on a one-minute time
+    wheel. Each minute gets at most max_per_minute entries; without a
+    pacing target they are spread evenly. If the window is too short
+    for the pacing target, the last entries go out after it closes
+    rather than faster.
+    """
+    day = getdate(on_date)
+    window_start = datetime.combine(day, get_time(rule.send_window_start))
+    window_end = datetime.combine(day, get_time(rule.send_window_end))
+    start = max(window_start, now_datetime().replace(second=0, microsecond=0))
+    minutes = max(1, int((window_end - start).total_seconds() // 60))
+
+    per_minute = cint(rule.max_per_minute)
+    fits = not per_minute or len(entries) <= per_minute * minutes
+
+    slots = defaultdict(list)
+    for i, entry in enumerate(entries):
+        offset = i * minutes // len(entries) if fits else i // per_minute
+        slots[start + timedelta(minutes=offset)].append(entry.name)
+
+    # One statement per minute slot rather than per entry
+    for slot, names in slots.items():
+        frappe.db.sql("""
+            UPDATE `tabNotification Schedule`
+            SET scheduled_at = %s
+            WHERE name IN %s
+        """, (slot, names))
+
+
+def get_dispatch_limit(rules):
+    """
+    Entries one dispatcher tick may send: the sum of the paced rules'
+    max_per_minute, plus DISPATCH_LIMIT when a rule is spread evenly.
+    """
+    windowed = [rule for rule in rules if rule.send_window_start and rule.send_window_end]
+    limit = sum(cint(rule.max_per_minute) for rule in windowed)
+    if not limit or any(not cint(rule.max_per_minute) for rule in windowed):
+        limit += DISPATCH_LIMIT
+    return limit
+
+
+def dispatch_due_notifications(limit=None):
+    """
+    Send calendar entries whose slot has come (scheduled every minute).
+    Only the scheduler holding the lease dispatches.
+    """
+    if not frappe.db.exists("Notification Schedule", {"status": "Pending", "scheduled_at": ["<=", now()]}):
+        return
+
+    with LeaseLock(DISPATCH_LEASE, ttl=frappe.conf.notification_lease_ttl or 60) as lease:
+        if not lease.acquired:
+            return
+
+        metrics = RunMetrics("Paced Dispatch")
+        manager = NotificationManager(metrics)
+        entries = frappe.get_all(
+            "Notification Schedule",
+            filters={"status": "Pending", "scheduled_at": ["<=", now()]},
+            fields=SCHEDULE_ENTRY_FIELDS,
+            order_by="scheduled_at asc",
+            limit=limit or get_dispatch_limit(manager.rules)
+        )
+
+        committer = BatchCommitter()
+        try:
+            for entry in entries:
+                lease.ensure_held()
+                sent = deliver_scheduled_notification(manager, entry)
+                count_delivery(metrics, entry, sent)
+                committer.add()
+        except Exception:
+            # Entries since the last batch are sent already; rolling back
+            # their status would send them again on the next tick
+            metrics.save("Failed", frappe.get_traceback())
+            frappe.db.commit()
+            raise
+
+        metrics.save()
+        frappe.db.commit()
+
+
+def deliver_scheduled_notification(manager, entry):
+    customer = frappe._dict(name=entry.customer, loyalty_program=entry.loyalty_program)
+    try:
+        with savepoint(CUSTOMER_SAVEPOINT):
+            with manager.metrics.stage("send_sms"):
+                timed_send_sms(
+                    receiver_list=[entry.mobile_no],
+                    msg=entry.message
+                )
+
+            message = (
+                f"Notification sent with discount value: {entry.discount_value}"
+                if entry.coupon else entry.message
+            )
+            manager.log_notification(
+                customer, entry.event_type, "Success", message, entry.coupon, entry.loyalty_tier,
+                sms_segments=count_segments(entry.message).segments
+            )
+            frappe.db.set_value("Notification Schedule", entry.name, {"status": "Sent", "sent_at": now()})
+        return True
+
+    except Exception as e:
+        manager.log_notification(
+            customer, entry.event_type, "Failed", str(e), entry.coupon, entry.loyalty_tier,
+            sms_message=entry.message, retryable=is_retryable_send_error(e)
+        )
+        frappe.db.set_value("Notification Schedule", entry.name, {"status": "Failed", "error": str(e)})
+        return False
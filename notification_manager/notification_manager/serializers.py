@@ -0,0 +1,28 @@
+"""
+Compact encodings for bulk item reads.
+
+Kept free of frappe imports so the formats can be benchmarked standalone
+(see notification_manager/benchmarks/item_formats.py).
+"""
+
+
+def to_columnar(columns, rows):
+    """
+    Column names once plus one value array per column.
+    `rows` are tuples in `columns` order.
+    """
+    if not rows:
+        return {"columns": list(columns), "values": [[] for _ in columns]}
+    return {"columns": list(columns), "values": [list(values) for values in zip(*rows, strict=True)]}
+
+
+def iter_msgpack_chunks(columns, rows, chunk_size=1000, default=str):
+    """
+    Yield the rows as a stream of msgpack-encoded columnar chunks.
+    Read them back with msgpack.Unpacker, one map per chunk.
+    """
+    import msgpack
+
+    packer = msgpack.Packer(default=default)
+    for start in range(0, len(rows), chunk_size):
+        yield packer.pack(to_columnar(columns, rows[start:start + chunk_size]))
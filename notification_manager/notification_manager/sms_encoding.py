@@ -0,0 +1,82 @@
+"""
+SMS segment counting and GSM-7 transliteration.
+
+A message that fits the GSM-7 alphabet carries 160 characters in one
+segment (153 per segment once split). Anything else, Cyrillic included,
+goes out as UCS-2 with 70 characters (67 when split).
+"""
+import math
+import unicodedata
+from collections import namedtuple
+
+GSM7_BASIC = set(
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+# Sent with an escape character, so they take two septets
+GSM7_EXTENDED = set("^{}\\[~]|€\f")
+
+GSM7_SINGLE, GSM7_MULTI = 160, 153
+UCS2_SINGLE, UCS2_MULTI = 70, 67
+
+# Mongolian Cyrillic to Latin; Ö and Ü are part of GSM-7
+CYRILLIC_TO_LATIN = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "ye", "ё": "yo", "ж": "j",
+    "з": "z", "и": "i", "й": "i", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o",
+    "ө": "ö", "п": "p", "р": "r", "с": "s", "т": "t", "у": "u", "ү": "ü", "ф": "f",
+    "х": "kh", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "shch", "ъ": "", "ы": "y", "ь": "i",
+    "э": "e", "ю": "yu", "я": "ya",
+}
+
+# Typographic characters and symbols with a plain GSM-7 look-alike
+PUNCTUATION = {
+    "₮": "MNT",
+    "‘": "'", "’": "'", "“": '"', "”": '"', "–": "-", "—": "-",
+    "…": "...", " ": " ", "•": "-", "«": '"', "»": '"', "№": "No",
+}
+
+SmsSegments = namedtuple("SmsSegments", ["encoding", "length", "segments"])
+
+
+def is_gsm7(text):
+    return all(char in GSM7_BASIC or char in GSM7_EXTENDED for char in text)
+
+
+def count_segments(text):
+    """
+    Encoding, length in encoding units and number of segments of `text`.
+    """
+    text = text or ""
+    if is_gsm7(text):
+        length = sum(2 if char in GSM7_EXTENDED else 1 for char in text)
+        single, multi, encoding = GSM7_SINGLE, GSM7_MULTI, "GSM-7"
+    else:
+        # UTF-16 code units; characters outside the BMP take two
+        length = len(text.encode("utf-16-le")) // 2
+        single, multi, encoding = UCS2_SINGLE, UCS2_MULTI, "UCS-2"
+
+    segments = 1 if length <= single else math.ceil(length / multi)
+    return SmsSegments(encoding, length, segments)
+
+
+def transliterate_char(char):
+    lower = char.lower()
+    if lower in CYRILLIC_TO_LATIN:
+        latin = CYRILLIC_TO_LATIN[lower]
+        return latin[:1].upper() + latin[1:] if char != lower else latin
+    return PUNCTUATION.get(char, char)
+
+
+def to_gsm7(text):
+    """
+    Transliterate Cyrillic and typographic characters, then drop accents
+    GSM-7 cannot carry; whatever is left becomes "?".
+    """
+    result = []
+    for char in "".join(transliterate_char(char) for char in text or ""):
+        if char in GSM7_BASIC or char in GSM7_EXTENDED:
+            result.append(char)
+            continue
+        stripped = "".join(c for c in unicodedata.normalize("NFKD", char) if not unicodedata.combining(c))
+        result.append(stripped if stripped and is_gsm7(stripped) else "?")
+    return "".join(result)
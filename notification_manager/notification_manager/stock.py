@@ -0,0 +1,199 @@
+import time
+
+import frappe
+
+# Redis hash of "item_code::warehouse" -> actual_qty
+ITEM_STOCK_SNAPSHOT_KEY = "item_stock_snapshot"
+
+# Bumped whenever an Item or a Bin changes; served to clients as an ETag
+ITEM_STOCK_VERSION_KEY = "item_stock_version"
+
+# Redis set of the dirty-bin sets of the builds in progress
+ITEM_STOCK_BUILDS_KEY = "item_stock_snapshot_builds"
+
+SNAPSHOT_CHUNK_SIZE = 5000
+
+# Left behind if a build dies halfway
+SNAPSHOT_BUILD_TTL = 60 * 60
+
+
+def get_stock_version():
+    """
+    Current catalog version, or None while Redis has no snapshot yet; a
+    background build is queued then so requests never wait for it.
+    """
+    cache = frappe.cache()
+    version = cache.get(cache.make_key(ITEM_STOCK_VERSION_KEY))
+    if version is None:
+        frappe.enqueue(
+            "notification_manager.notification_manager.stock.build_stock_snapshot",
+            queue="long",
+            job_id="item_stock_snapshot",
+            deduplicate=True
+        )
+        return None
+    return int(version)
+
+
+def build_stock_snapshot():
+    """
+    Load every Bin into the snapshot (also run hourly as a safety net for
+    bin updates that bypass document hooks, e.g. reposting).
+    """
+    cache = frappe.cache()
+    snapshot_key = cache.make_key(ITEM_STOCK_SNAPSHOT_KEY)
+    builds_key = cache.make_key(ITEM_STOCK_BUILDS_KEY)
+    # Per build, so overlapping builds never rename each other's key
+    building_key = f"{snapshot_key}:building:{frappe.generate_hash(length=10)}"
+    # Bins refresh_dirty_stock updates while this build runs
+    dirty_key = f"{building_key}:dirty"
+
+    pipe = cache.pipeline()
+    pipe.sadd(builds_key, dirty_key)
+    pipe.expire(builds_key, SNAPSHOT_BUILD_TTL)
+    pipe.execute()
+
+    last_name = ""
+    while True:
+        bins = frappe.db.sql("""
+            SELECT name, item_code, warehouse, actual_qty
+            FROM `tabBin`
+            WHERE name > %s
+            ORDER BY name
+            LIMIT %s
+        """, (last_name, SNAPSHOT_CHUNK_SIZE), as_dict=True)
+        if not bins:
+            break
+        last_name = bins[-1].name
+
+        # Raw hash fields (not pickled) so partial updates stay cheap
+        pipe = cache.pipeline()
+        pipe.hset(building_key, mapping={f"{b.item_code}::{b.warehouse}": b.actual_qty or 0 for b in bins})
+        pipe.expire(building_key, SNAPSHOT_BUILD_TTL)
+        pipe.execute()
+
+    # One transaction: a refresh either lands in the dirty set read here
+    # or, coming after, writes to the renamed snapshot itself
+    pipe = cache.pipeline()
+    if last_name:
+        pipe.rename(building_key, snapshot_key)
+        pipe.persist(snapshot_key)
+    else:
+        pipe.delete(snapshot_key)
+    pipe.srem(builds_key, dirty_key)
+    pipe.smembers(dirty_key)
+    pipe.delete(dirty_key)
+    dirty = pipe.execute()[-2]
+
+    # A chunk read before a bin was committed would otherwise overwrite
+    # the newer quantity the refresh wrote
+    pipe = cache.pipeline()
+    if dirty:
+        mapping = get_bin_quantities([frappe.safe_decode(field).split("::", 1) for field in dirty])
+        if mapping:
+            pipe.hset(snapshot_key, mapping=mapping)
+
+    # Millisecond based so a rebuilt snapshot never reuses an old version
+    version = int(time.time() * 1000)
+    pipe.set(cache.make_key(ITEM_STOCK_VERSION_KEY), version)
+    pipe.execute()
+
+    return version
+
+
+def get_stock_snapshot(warehouse=None):
+    """
+    Quantities per item from the snapshot, optionally for one warehouse.
+    """
+    cache = frappe.cache()
+    if not cache.exists(cache.make_key(ITEM_STOCK_VERSION_KEY)):
+        return get_live_stock(warehouse)
+
+    stock = {}
+    for key, qty in cache.hscan_iter(cache.make_key(ITEM_STOCK_SNAPSHOT_KEY), count=SNAPSHOT_CHUNK_SIZE):
+        item_code, bin_warehouse = frappe.safe_decode(key).split("::", 1)
+        if warehouse and bin_warehouse != warehouse:
+            continue
+        stock[item_code] = stock.get(item_code, 0) + float(qty)
+    return stock
+
+
+def get_live_stock(warehouse=None):
+    """
+    Quantities per item summed from Bin, for when there is no snapshot.
+    """
+    return dict(frappe.db.sql("""
+        SELECT item_code, SUM(actual_qty)
+        FROM `tabBin`
+        {condition}
+        GROUP BY item_code
+    """.format(condition="WHERE warehouse = %(warehouse)s" if warehouse else ""), {"warehouse": warehouse}))
+
+
+def mark_stock_dirty(doc, method=None):
+    """
+    Remember the changed item/warehouse and refresh it once after commit.
+    Stock Ledger Entries are hooked as well because ERPNext updates Bin
+    quantities with db.set_value, which does not fire Bin on_update.
+    """
+    dirty = frappe.flags.dirty_item_stock
+    if dirty is None:
+        dirty = frappe.flags.dirty_item_stock = set()
+        frappe.db.after_commit.add(refresh_dirty_stock)
+        frappe.db.after_rollback.add(clear_dirty_stock)
+
+    if doc.doctype == "Item":
+        dirty.add((doc.name, None))
+    else:
+        dirty.add((doc.item_code, doc.warehouse))
+
+
+def clear_dirty_stock():
+    frappe.flags.dirty_item_stock = None
+
+
+def refresh_dirty_stock():
+    """
+    Re-read the dirty bins with one query and bump the version.
+    """
+    dirty = frappe.flags.dirty_item_stock
+    clear_dirty_stock()
+    if not dirty:
+        return
+
+    cache = frappe.cache()
+    builds = cache.smembers(cache.make_key(ITEM_STOCK_BUILDS_KEY))
+    has_snapshot = cache.exists(cache.make_key(ITEM_STOCK_VERSION_KEY))
+    if not has_snapshot and not builds:
+        # No snapshot yet; the queued full build reads these bins too
+        return
+
+    pipe = cache.pipeline()
+
+    bins = [(item_code, warehouse) for item_code, warehouse in dirty if warehouse]
+    if bins:
+        # Re-read by the builds in progress once they swap their snapshot in
+        for dirty_key in builds:
+            pipe.sadd(dirty_key, *(f"{item_code}::{warehouse}" for item_code, warehouse in bins))
+            pipe.expire(dirty_key, SNAPSHOT_BUILD_TTL)
+
+        mapping = get_bin_quantities(bins) if has_snapshot else None
+        if mapping:
+            pipe.hset(cache.make_key(ITEM_STOCK_SNAPSHOT_KEY), mapping=mapping)
+
+    if has_snapshot:
+        pipe.incr(cache.make_key(ITEM_STOCK_VERSION_KEY))
+    pipe.execute()
+
+
+def get_bin_quantities(bins):
+    """
+    Snapshot fields of the given (item_code, warehouse) pairs, read with one query.
+    """
+    conditions = " OR ".join(["(item_code = %s AND warehouse = %s)"] * len(bins))
+    rows = frappe.db.sql(
+        f"SELECT item_code, warehouse, actual_qty FROM `tabBin` WHERE {conditions}",
+        [value for pair in bins for value in pair],
+        as_dict=True
+    )
+    return {f"{row.item_code}::{row.warehouse}": row.actual_qty or 0 for row in rows}
@@ -0,0 +1,90 @@
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from notification_manager.notification_manager.customer import (
+    find_customers_by_mobile,
+    get_shared_mobiles,
+    get_sms_receiver,
+    normalize_mobile,
+)
+
+
+class TestNormalizeMobile(FrappeTestCase):
+    def setUp(self):
+        conf = patch.dict(frappe.local.conf, {
+            "notification_default_country_code": None,
+            "notification_local_number_length": None,
+        })
+        conf.start()
+        self.addCleanup(conf.stop)
+
+    def test_local_formats(self):
+        for number in ("99112233", "9911 2233", "9911-2233", "(9911) 2233", "099112233", " 99112233 "):
+            self.assertEqual(normalize_mobile(number), "+97699112233", number)
+
+    def test_international_formats(self):
+        for number in ("+97699112233", "+976 9911 2233", "0097699112233", "97699112233"):
+            self.assertEqual(normalize_mobile(number), "+97699112233", number)
+
+        self.assertEqual(normalize_mobile("+1 (415) 555-0100"), "+14155550100")
+
+    def test_invalid_or_short_numbers(self):
+        for number in (None, "", "   ", "-", "12345", "1234567", "991122334", "+1234567", "+1234567890123456"):
+            self.assertIsNone(normalize_mobile(number), number)
+
+    def test_other_country(self):
+        self.assertEqual(normalize_mobile("0612345678", country_code="31", local_length=9), "+31612345678")
+        self.assertIsNone(normalize_mobile("12345678", country_code="31", local_length=9))
+
+
+class TestSmsReceiver(FrappeTestCase):
+    def test_sends_the_number_as_entered(self):
+        with patch.dict(frappe.local.conf, {"notification_receiver_format": None}):
+            customer = frappe._dict(mobile_no="9911-2233", phone="", custom_mobile_e164="+97699112233")
+            self.assertEqual(get_sms_receiver(customer), "9911-2233")
+            self.assertEqual(get_sms_receiver(frappe._dict(phone="99112233")), "99112233")
+
+    def test_e164_format(self):
+        with patch.dict(frappe.local.conf, {"notification_receiver_format": "e164"}):
+            customer = frappe._dict(mobile_no="9911-2233", custom_mobile_e164="+97699112233")
+            self.assertEqual(get_sms_receiver(customer), "+97699112233")
+
+            # Not normalizable, sent as entered rather than dropped
+            self.assertEqual(get_sms_receiver(frappe._dict(mobile_no="12345", custom_mobile_e164=None)), "12345")
+
+
+class TestSharedMobiles(FrappeTestCase):
+    def setUp(self):
+        self.customers = [self.make_customer(name, mobile) for name, mobile in (
+            ("_Test Shared Mobile 1", "88776655"),
+            ("_Test Shared Mobile 2", "+976 8877 6655"),
+            ("_Test Own Mobile", "88776644"),
+        )]
+
+    def tearDown(self):
+        for customer in self.customers:
+            frappe.delete_doc("Customer", customer.name, force=True, ignore_permissions=True)
+
+    def make_customer(self, customer_name, mobile_no):
+        return frappe.get_doc({
+            "doctype": "Customer",
+            "customer_name": customer_name,
+            "customer_type": "Individual",
+            "customer_group": "All Customer Groups",
+            "territory": "All Territories",
+            "mobile_no": mobile_no,
+        }).insert(ignore_permissions=True)
+
+    def test_find_customers_by_mobile(self):
+        shared = [customer.name for customer in self.customers[:2]]
+        self.assertEqual(find_customers_by_mobile("0088776655"), shared)
+        self.assertEqual(find_customers_by_mobile("88776644"), [self.customers[2].name])
+        self.assertEqual(find_customers_by_mobile("12345"), [])
+
+    def test_shared_mobiles_report(self):
+        report = {row.mobile: row for row in get_shared_mobiles(limit=1000)}
+        self.assertEqual(report["+97688776655"].customer_count, 2)
+        self.assertEqual(report["+97688776655"].customers, [customer.name for customer in self.customers[:2]])
+        self.assertNotIn("+97688776644", report)
@@ -0,0 +1,25 @@
+from frappe.tests.utils import FrappeTestCase
+
+from notification_manager.notification_manager.loyalty import classify_tiers, determine_tier
+
+TIERS = [(100000.0, "Classic 1"), (500000.0, "Silver"), (1000000.0, "Gold")]
+
+
+class TestLoyalty(FrappeTestCase):
+    def test_classify_tiers_boundaries(self):
+        totals = [0, 99999.99, 100000, 100000.01, 500000, 999999, 1000000, 1000000.01]
+        self.assertEqual(
+            list(classify_tiers(totals, TIERS)),
+            ["Classic 1", "Classic 1", "Classic 1", "Silver", "Silver", "Gold", "Gold", "Classic"]
+        )
+
+    def test_classify_tiers_matches_determine_tier(self):
+        totals = [-5, 0, 1, 250000, 500000.5, 750000, 2000000]
+        self.assertEqual(
+            list(classify_tiers(totals, TIERS)),
+            [determine_tier(total, TIERS) for total in totals]
+        )
+
+    def test_classify_tiers_without_totals_or_tiers(self):
+        self.assertEqual(list(classify_tiers([], TIERS)), [])
+        self.assertEqual(list(classify_tiers([10, 20], [])), ["Classic", "Classic"])
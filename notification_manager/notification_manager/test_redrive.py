@@ -0,0 +1,57 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+import frappe
+import requests
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import now_datetime
+
+from notification_manager.notification_manager.redrive import (
+    RETRY_MAX_SECONDS,
+    get_retry_fields,
+    is_retryable_send_error,
+)
+
+
+def http_error(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    return requests.HTTPError(response=response)
+
+
+class TestRedrive(FrappeTestCase):
+    def setUp(self):
+        conf = patch.dict(frappe.local.conf, {"notification_retry_base_seconds": 60, "notification_retry_max_attempts": 5})
+        conf.start()
+        self.addCleanup(conf.stop)
+
+    def assertRetryWithin(self, fields, low, high):
+        self.assertEqual(fields["retryable"], 1)
+        delay = fields["next_retry_at"] - now_datetime()
+        # A little slack for the time between the call and this check
+        self.assertGreaterEqual(delay, timedelta(seconds=low - 5))
+        self.assertLessEqual(delay, timedelta(seconds=high))
+
+    def test_backoff_doubles_per_attempt(self):
+        self.assertRetryWithin(get_retry_fields(1), 30, 60)
+        self.assertRetryWithin(get_retry_fields(2), 60, 120)
+        self.assertRetryWithin(get_retry_fields(4), 240, 480)
+
+    def test_backoff_is_capped(self):
+        frappe.local.conf.notification_retry_base_seconds = 60 * 60
+        fields = get_retry_fields(4)
+        self.assertRetryWithin(fields, RETRY_MAX_SECONDS / 2, RETRY_MAX_SECONDS)
+
+    def test_gives_up_after_max_attempts(self):
+        self.assertEqual(get_retry_fields(5), {"retryable": 0, "attempts": 5, "next_retry_at": None})
+        self.assertEqual(get_retry_fields(6)["retryable"], 0)
+
+    def test_retryable_send_errors(self):
+        self.assertTrue(is_retryable_send_error(requests.Timeout()))
+        self.assertTrue(is_retryable_send_error(requests.ConnectionError()))
+        self.assertTrue(is_retryable_send_error(http_error(429)))
+        self.assertTrue(is_retryable_send_error(http_error(503)))
+
+        self.assertFalse(is_retryable_send_error(http_error(400)))
+        self.assertFalse(is_retryable_send_error(requests.HTTPError()))
+        self.assertFalse(is_retryable_send_error(frappe.ValidationError("Please Update SMS Settings")))
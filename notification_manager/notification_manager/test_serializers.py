@@ -0,0 +1,32 @@
+import unittest
+
+from notification_manager.notification_manager.serializers import iter_msgpack_chunks, to_columnar
+
+COLUMNS = ["name", "item_name", "actual_qty"]
+
+
+class TestSerializers(unittest.TestCase):
+    def test_to_columnar(self):
+        rows = [("ITEM-1", "Milk", 3.0), ("ITEM-2", "Bread", 0)]
+        self.assertEqual(to_columnar(COLUMNS, rows), {
+            "columns": COLUMNS,
+            "values": [["ITEM-1", "ITEM-2"], ["Milk", "Bread"], [3.0, 0]],
+        })
+
+    def test_to_columnar_without_rows(self):
+        self.assertEqual(to_columnar(COLUMNS, []), {"columns": COLUMNS, "values": [[], [], []]})
+
+    def test_msgpack_chunks(self):
+        try:
+            import msgpack
+        except ImportError:
+            self.skipTest("msgpack is not installed")
+
+        rows = [(f"ITEM-{i}", f"Item {i}", i) for i in range(5)]
+        unpacker = msgpack.Unpacker()
+        for chunk in iter_msgpack_chunks(COLUMNS, rows, chunk_size=2):
+            unpacker.feed(chunk)
+
+        chunks = list(unpacker)
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual([name for chunk in chunks for name in chunk["values"][0]], [row[0] for row in rows])
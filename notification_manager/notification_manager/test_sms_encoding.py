@@ -0,0 +1,51 @@
+import unittest
+
+from notification_manager.notification_manager.sms_encoding import count_segments, is_gsm7, to_gsm7
+
+
+class TestCountSegments(unittest.TestCase):
+    def assertSegments(self, text, encoding, length, segments):
+        self.assertEqual(tuple(count_segments(text)), (encoding, length, segments))
+
+    def test_gsm7_boundaries(self):
+        self.assertSegments("", "GSM-7", 0, 1)
+        self.assertSegments("a" * 160, "GSM-7", 160, 1)
+        self.assertSegments("a" * 161, "GSM-7", 161, 2)
+        self.assertSegments("a" * 306, "GSM-7", 306, 2)
+        self.assertSegments("a" * 307, "GSM-7", 307, 3)
+
+    def test_escape_characters_take_two_septets(self):
+        self.assertSegments("€" * 80, "GSM-7", 160, 1)
+        self.assertSegments("€" * 80 + "a", "GSM-7", 161, 2)
+        self.assertSegments("{[~]}", "GSM-7", 10, 1)
+
+    def test_ucs2_boundaries(self):
+        self.assertSegments("б" * 70, "UCS-2", 70, 1)
+        self.assertSegments("б" * 71, "UCS-2", 71, 2)
+        self.assertSegments("б" * 134, "UCS-2", 134, 2)
+        self.assertSegments("б" * 135, "UCS-2", 135, 3)
+
+    def test_one_non_gsm7_character_switches_to_ucs2(self):
+        self.assertSegments("a" * 100 + "₮", "UCS-2", 101, 2)
+
+    def test_characters_outside_the_bmp_take_two_units(self):
+        self.assertSegments("😀" * 35, "UCS-2", 70, 1)
+        self.assertSegments("😀" * 36, "UCS-2", 72, 2)
+
+
+class TestToGsm7(unittest.TestCase):
+    def test_mongolian_cyrillic(self):
+        self.assertEqual(to_gsm7("Сайн байна уу"), "Sain baina uu")
+        self.assertEqual(to_gsm7("Өлзий Үүрийн Хишиг"), "Ölzii Üüriin Khishig")
+
+    def test_punctuation_and_currency(self):
+        self.assertEqual(to_gsm7("50000₮ – “Gold”…"), '50000MNT - "Gold"...')
+
+    def test_accents_are_dropped_or_replaced(self):
+        self.assertEqual(to_gsm7("café ç"), "café c")
+        self.assertEqual(to_gsm7("中"), "?")
+
+    def test_result_is_always_gsm7(self):
+        text = to_gsm7("Бат-Эрдэнэ, таны 50000₮ купон: ABC123 😀 ł")
+        self.assertTrue(is_gsm7(text))
+        self.assertEqual(count_segments(text).encoding, "GSM-7")
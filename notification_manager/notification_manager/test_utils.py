@@ -0,0 +1,73 @@
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from notification_manager.notification_manager.utils import (
+    IMPORT_WELCOME_LAST_KEY,
+    IMPORT_WELCOME_QUEUE_KEY,
+    NotificationManager,
+    send_import_welcome_notifications,
+)
+
+TEST_RULE = "_Test Import Welcome"
+
+
+class TestImportWelcome(FrappeTestCase):
+    def setUp(self):
+        if not frappe.db.exists("Notification Rule", {"rule_name": TEST_RULE}):
+            frappe.get_doc({
+                "doctype": "Notification Rule",
+                "rule_name": TEST_RULE,
+                "enabled": 1,
+                "event_type": "New Registration",
+                "discount_type": "Amount",
+                "discount_value": 5000,
+                "validity_days": 30,
+                "message_template": "Welcome {customer_name}! {coupon_code} {discount_value} {validity_days}",
+            }).insert(ignore_permissions=True)
+
+        frappe.cache().delete_value(IMPORT_WELCOME_QUEUE_KEY)
+        self.customer = self.import_customer()
+        # Pretend the import went quiet long ago
+        frappe.cache().set(frappe.cache().make_key(IMPORT_WELCOME_LAST_KEY), 0)
+
+    def tearDown(self):
+        frappe.cache().delete_value(IMPORT_WELCOME_QUEUE_KEY)
+        frappe.delete_doc("Customer", self.customer.name, force=True, ignore_permissions=True)
+
+    def import_customer(self):
+        frappe.flags.in_import = True
+        try:
+            return frappe.get_doc({
+                "doctype": "Customer",
+                "customer_name": "_Test Imported Customer",
+                "customer_type": "Individual",
+                "customer_group": "All Customer Groups",
+                "territory": "All Territories",
+                "mobile_no": "99887766",
+            }).insert(ignore_permissions=True)
+        finally:
+            frappe.flags.in_import = False
+
+    def test_imported_customer_is_welcomed(self):
+        self.assertEqual(frappe.cache().llen(IMPORT_WELCOME_QUEUE_KEY), 1)
+
+        with (
+            patch.dict(frappe.local.conf, {"notification_receiver_format": None}),
+            patch("notification_manager.notification_manager.utils.timed_send_sms") as send_sms,
+        ):
+            send_import_welcome_notifications()
+
+        send_sms.assert_called_once()
+        self.assertEqual(send_sms.call_args.kwargs["receiver_list"], ["99887766"])
+        self.assertEqual(frappe.cache().llen(IMPORT_WELCOME_QUEUE_KEY), 0)
+
+    def test_failed_chunk_stays_queued(self):
+        with (
+            patch("notification_manager.notification_manager.utils.timed_send_sms"),
+            patch.object(NotificationManager, "log_notifications", side_effect=frappe.QueryTimeoutError),
+        ):
+            self.assertRaises(frappe.QueryTimeoutError, send_import_welcome_notifications)
+
+        self.assertEqual(frappe.cache().llen(IMPORT_WELCOME_QUEUE_KEY), 1)
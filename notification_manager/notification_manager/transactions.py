@@ -0,0 +1,44 @@
+from contextlib import contextmanager
+
+import frappe
+from frappe.utils import cint
+
+DEFAULT_COMMIT_BATCH_SIZE = 100
+
+
+class BatchCommitter:
+    """
+    Commit once every `batch_size` units of work instead of after each
+    one. The size can be set with notification_commit_batch_size in
+    site config.
+    """
+
+    def __init__(self, batch_size=None):
+        self.batch_size = batch_size or cint(frappe.conf.notification_commit_batch_size) or DEFAULT_COMMIT_BATCH_SIZE
+        self.pending = 0
+
+    def add(self, count=1):
+        self.pending += count
+        if self.pending >= self.batch_size:
+            self.commit()
+
+    def commit(self):
+        if self.pending:
+            frappe.db.commit()
+            self.pending = 0
+
+
+@contextmanager
+def savepoint(name):
+    """
+    Undo only the block's writes if it raises; the rest of the open
+    batch is kept.
+    """
+    frappe.db.savepoint(name)
+    try:
+        yield
+    except Exception:
+        frappe.db.rollback(save_point=name)
+        raise
+    else:
+        frappe.db.release_savepoint(name)
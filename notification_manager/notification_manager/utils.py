@@ -1,13 +1,61 @@
+import random
+import string
+import time
+
 import frappe
 from frappe import _
-from frappe.utils import today, add_days
-from frappe.core.doctype.sms_settings.sms_settings import send_sms
+from frappe.utils import add_days, get_time, now, now_datetime, today
+
+from notification_manager.notification_manager.customer import SMS_RECEIVER_FIELDS, get_sms_receiver
+from notification_manager.notification_manager.lease import LeaseLock
+from notification_manager.notification_manager.loyalty import classify_tiers, get_program_tiers
+from notification_manager.notification_manager.metrics import RunMetrics
+from notification_manager.notification_manager.profiling import profiled, timed_send_sms
+from notification_manager.notification_manager.redrive import get_retry_fields, is_retryable_send_error
+from notification_manager.notification_manager.sms_encoding import count_segments, to_gsm7
+from notification_manager.notification_manager.transactions import BatchCommitter, savepoint
 import random
 import string
 
+DAILY_NOTIFICATIONS_LEASE = "daily_notifications"
+
+# Earliest time of day the daily job sends; the scheduler tries again
+# every few minutes after it until a run completes
+DAILY_NOTIFICATIONS_START = "10:45"
+
+# Rolled back to when a single customer's notification fails
+CUSTOMER_SAVEPOINT = "notification_customer"
+
+# Set for a date once its daily run succeeded, so no other scheduler repeats it
+DAILY_NOTIFICATIONS_DONE_KEY = "daily_notifications_done"
+
+# Customers created by a Data Import wait here for one batched welcome,
+# which is sent once no new row arrived for the quiet period
+IMPORT_WELCOME_QUEUE_KEY = "notification_import_welcome_queue"
+IMPORT_WELCOME_LAST_KEY = "notification_import_welcome_last"
+IMPORT_QUIET_SECONDS = 120
+
+# Receivers per send_sms call
+SMS_RECEIVER_CHUNK = 500
+
+NOTIFICATION_LOG_FIELDS = [
+    "name", "customer", "event_type", "status", "message", "loyalty_program", "sms_segments",
+    "owner", "modified_by", "creation", "modified", "docstatus", "idx",
+]
+
+def normalize_tier(tier):
+    """Classic 1 and Classic 2 share the Classic discounts"""
+    if tier == 'Classic 1' or tier == 'Classic 2':
+        return 'Classic'
+    return tier
+
+
 class NotificationManager:
-    def __init__(self):
+    def __init__(self, metrics=None):
+        self.metrics = metrics or RunMetrics("Ad Hoc")
         self.sms_settings = frappe.get_doc("SMS Settings")
+        # (pricing rule title, discount) -> Pricing Rule saved by this manager
+        self.pricing_rules = {}
         self.load_rules()
         
     
@@ -29,34 +77,44 @@ class NotificationManager:
             )
 
 
-    def send_notification(self, customer, event_type):
-        """Send notification based on event type"""
-        if not customer.mobile_no:
+    def send_notification(self, customer, event_type, rule=None):
+        """Send notification based on event type, or with the given rule"""
+        if not get_sms_receiver(customer):
             self.log_notification(customer, event_type, "Failed", "No mobile number")
             return False
 
-        rule = self.get_rule(event_type)
+        rule = rule or self.get_rule(event_type)
         if not rule:
             self.log_notification(customer, event_type, "Failed", "No rule found")
             return False
 
         try:
-            # Prepare message
-            message = rule.message_template
+            with savepoint(CUSTOMER_SAVEPOINT):
+                # Prepare message
+                message = self.render_sms(rule, rule.message_template)
 
-            # Send SMS
-            send_sms(
-                receiver_list=[customer.mobile_no],
-                msg=message
-            )
+                # Send SMS
+                try:
+                    with self.metrics.stage("send_sms"):
+                        timed_send_sms(
+                            receiver_list=[get_sms_receiver(customer)],
+                            msg=message
+                        )
+                except Exception as e:
+                    if not is_retryable_send_error(e):
+                        raise
+                    # Left to redrive_failed_notifications
+                    self.log_notification(customer, event_type, "Failed", str(e), sms_message=message, retryable=True)
+                    return False
 
-            # Log success
-            self.log_notification(
-                customer, event_type, "Success",
-                message,
-                None
-            )
-            return True
+                # Log success
+                self.log_notification(
+                    customer, event_type, "Success",
+                    message,
+                    None,
+                    sms_segments=count_segments(message).segments
+                )
+                return True
 
         except Exception as e:
             self.log_notification(customer, event_type, "Failed", str(e))
@@ -73,102 +131,52 @@ class NotificationManager:
             return False
         
     
-    def send_tier_notification(self, customer, event_type):
+    def send_tier_notification(self, customer, event_type, rule=None):
         """Send notification with tier-specific discount values"""
-        if not customer.mobile_no:
+        if not get_sms_receiver(customer):
             self.log_notification(customer, event_type, "Failed", "No mobile number")
             return False
 
-        rule = self.get_rule(event_type)
+        rule = rule or self.get_rule(event_type)
         if not rule:
             self.log_notification(customer, event_type, "Failed", "No rule found")
             return False
 
         try:
-            # Get customer's current tier
-            customer_tier = customer.loyalty_program_tier
-            
-            # If tier is classic 1 then make it classic
-            if customer_tier == 'Classic 1' or customer_tier == 'Classic 2':
-                customer_tier = 'Classic'
-            
-            # Find matching tier discount
-            tier_discount = None
-            for td in rule.tier_discounts:
-                if td.tier_name == customer_tier:
-                    tier_discount = td
-                    break
-            
-            # Use default discount value if no tier-specific discount found
-            discount_value = tier_discount.discount_value if tier_discount else rule.discount_value
-            pricing_rule_title = event_type + "_" + customer_tier
-            
-            # Check if PricingRule exists update discount_value as notification rule
-            pricing_rule_name = frappe.db.exists("Pricing Rule", {"title": pricing_rule_title})
-            
-            fields = {
-                "title": pricing_rule_title,
-                "apply_on": "Transaction",
-                "price_or_product_discount": "Price",
-                "coupon_code_based": 1,
-                "selling": 1,
-                "buying": 0,
-                "valid_from": "2024-12-15",
-                "company": "LAC",
-                "currency": "MNT",
-                "rate_or_discount": "Discount Amount",
-                "apply_discount_on": "Grand Total",
-                "discount_amount": discount_value or 0.0,  # taken from notification rule
-                "disable": 0
-            }
-            
-            pr_doc = None
-            if pricing_rule_name:
-                # Update existing pricing rule
-                pr_doc = frappe.get_doc("Pricing Rule", pricing_rule_name)
-                for key, val in fields.items():
-                    pr_doc.set(key, val)
-                pr_doc.save()
-            # If not exists then create PricingRule
-            else:
-                pr_doc = frappe.get_doc({
-                    "doctype": "Pricing Rule",
-                    **fields
-                })
-                pr_doc.insert(ignore_permissions=True)
-            
-            # Create Coupon
-            coupon_doc = self.create_coupon(customer, rule, pr_doc.name)
-            
-            # Prepare message by replacing placeholders
-            message = rule.message_template.replace(
-                "discount_value", str(discount_value)
-            ).replace(
-                "customer_name", customer.customer_name
-            ).replace(
-                "validity_days", str(rule.validity_days)
-            ).replace(
-                "loyalty_tier", customer_tier or "Classic"
-            ).replace(
-                "coupon_code", coupon_doc.coupon_code
-            )
+            with savepoint(CUSTOMER_SAVEPOINT):
+                prepared = self.prepare_tier_notification(customer, event_type, rule)
 
-            # Send SMS
-            send_sms(
-                receiver_list=[customer.mobile_no],
-                msg=message
-            )
+                # Send SMS
+                try:
+                    with self.metrics.stage("send_sms"):
+                        timed_send_sms(
+                            receiver_list=[get_sms_receiver(customer)],
+                            msg=prepared.message
+                        )
+                except Exception as e:
+                    if not is_retryable_send_error(e):
+                        raise
+                    # Keep the coupon; redrive_failed_notifications resends this message
+                    self.log_notification(
+                        customer, event_type, "Failed", str(e), prepared.coupon, prepared.loyalty_tier,
+                        sms_message=prepared.message, retryable=True
+                    )
+                    self.pricing_rules[prepared.pricing_rule_key] = prepared.pricing_rule
+                    return False
 
-            # Log success
-            self.log_notification(
-                customer, 
-                event_type, 
-                "Success",
-                f"Notification sent with discount value: {discount_value}",
-                None,
-                customer_tier
-            )
-            return True
+                # Log success
+                self.log_notification(
+                    customer,
+                    event_type,
+                    "Success",
+                    f"Notification sent with discount value: {prepared.discount_value}",
+                    None,
+                    prepared.loyalty_tier,
+                    sms_segments=count_segments(prepared.message).segments
+                )
+                # Only remembered once the savepoint can no longer roll it back
+                self.pricing_rules[prepared.pricing_rule_key] = prepared.pricing_rule
+                return True
 
         except Exception as e:
             self.log_notification(customer, event_type, "Failed", str(e))
@@ -185,6 +193,172 @@ class NotificationManager:
             )
             return False
 
+    def prepare_tier_notification(self, customer, event_type, rule, valid_from=None):
+        """Save the pricing rule, mint the coupon and render the message, without sending"""
+        # Get customer's current tier
+        customer_tier = normalize_tier(customer.loyalty_program_tier)
+
+        pricing_rule_key = self.get_pricing_rule_key(event_type, rule, customer_tier)
+        discount_value = pricing_rule_key[1]
+
+        with self.metrics.stage("pricing_rule_save"):
+            pricing_rule = self.save_pricing_rule(pricing_rule_key)
+
+        # Create Coupon
+        with self.metrics.stage("coupon_insert"):
+            coupon_doc = self.create_coupon(customer, rule, pricing_rule, valid_from)
+
+        # Prepare message by replacing placeholders
+        message = self.render_sms(rule, rule.message_template.replace(
+            "discount_value", str(discount_value)
+        ).replace(
+            "customer_name", customer.customer_name
+        ).replace(
+            "validity_days", str(rule.validity_days)
+        ).replace(
+            "loyalty_tier", customer_tier or "Classic"
+        ).replace(
+            "coupon_code", coupon_doc.coupon_code
+        ))
+
+        return frappe._dict(
+            message=message,
+            coupon=coupon_doc.name,
+            discount_value=discount_value,
+            loyalty_tier=customer_tier,
+            pricing_rule=pricing_rule,
+            pricing_rule_key=pricing_rule_key
+        )
+
+
+    def get_pricing_rule_key(self, event_type, rule, customer_tier):
+        """(Pricing Rule title, discount value) for a customer tier"""
+        # Find matching tier discount
+        tier_discount = None
+        for td in rule.tier_discounts:
+            if td.tier_name == customer_tier:
+                tier_discount = td
+                break
+
+        # Use default discount value if no tier-specific discount found
+        discount_value = tier_discount.discount_value if tier_discount else rule.discount_value
+        # Campaigns share an event type, so key their pricing rules by rule
+        title_prefix = rule.rule_name if event_type == "Campaign" else event_type
+        # Customers without a tier get the Classic rule, as in the message
+        return (title_prefix + "_" + (customer_tier or "Classic"), discount_value)
+
+    def save_pricing_rule(self, pricing_rule_key):
+        """
+        Create or update the Pricing Rule with these values, unless this
+        manager already saved it.
+        """
+        pricing_rule_title, discount_value = pricing_rule_key
+        if pricing_rule_key in self.pricing_rules:
+            return self.pricing_rules[pricing_rule_key]
+
+        fields = {
+            "title": pricing_rule_title,
+            "apply_on": "Transaction",
+            "price_or_product_discount": "Price",
+            "coupon_code_based": 1,
+            "selling": 1,
+            "buying": 0,
+            "valid_from": "2024-12-15",
+            "company": "LAC",
+            "currency": "MNT",
+            "rate_or_discount": "Discount Amount",
+            "apply_discount_on": "Grand Total",
+            "discount_amount": discount_value or 0.0,  # taken from notification rule
+            "disable": 0
+        }
+
+        # Check if PricingRule exists update discount_value as notification rule
+        pricing_rule_name = frappe.db.exists("Pricing Rule", {"title": pricing_rule_title})
+        if pricing_rule_name:
+            pr_doc = frappe.get_doc("Pricing Rule", pricing_rule_name)
+            for key, val in fields.items():
+                pr_doc.set(key, val)
+            pr_doc.save()
+        # If not exists then create PricingRule
+        else:
+            pr_doc = frappe.get_doc({
+                "doctype": "Pricing Rule",
+                **fields
+            })
+            pr_doc.insert(ignore_permissions=True)
+        return pr_doc.name
+
+
+    def send_bulk_notification(self, customer_names, event_type):
+        """
+        Send the rule's message to many customers with chunked send_sms
+        calls and log the results in bulk. Only for events whose message
+        has no per-customer values, like New Registration.
+        """
+        customers = frappe.get_all(
+            "Customer",
+            filters={"name": ["in", customer_names]},
+            fields=["name", *SMS_RECEIVER_FIELDS, "loyalty_program"]
+        )
+        rule = self.get_rule(event_type)
+        sms_message = self.render_sms(rule, rule.message_template) if rule else None
+        sms_segments = count_segments(sms_message).segments if rule else None
+        logs = []
+        sent = 0
+
+        reachable = []
+        for customer in customers:
+            if not get_sms_receiver(customer):
+                logs.append((customer, "Failed", "No mobile number", None))
+            elif not rule:
+                logs.append((customer, "Failed", "No rule found", None))
+            else:
+                reachable.append(customer)
+
+        for start in range(0, len(reachable), SMS_RECEIVER_CHUNK):
+            batch = reachable[start:start + SMS_RECEIVER_CHUNK]
+            try:
+                with self.metrics.stage("send_sms", rows=len(batch)):
+                    timed_send_sms(
+                        receiver_list=[get_sms_receiver(customer) for customer in batch],
+                        msg=sms_message,
+                        success_msg=False
+                    )
+                status, message = "Success", sms_message
+                self.metrics.count("sms_segments", rows=sms_segments * len(batch))
+                sent += len(batch)
+            except Exception as e:
+                status, message = "Failed", str(e)
+                frappe.log_error(
+                    title='Error occurred in bulk notification send.',
+                    message=f"""
+                    Method: send_bulk_notification
+                    Error: {e}
+                    Event Type: {event_type}
+                    Customers: {len(batch)}
+                    """,
+                    reference_doctype="Notification Rule"
+                )
+            logs += [(customer, status, message, sms_segments) for customer in batch]
+
+        self.log_notifications(logs, event_type)
+        return sent
+
+    def log_notifications(self, logs, event_type):
+        """Insert (customer, status, message, sms_segments) log rows in one statement"""
+        if not logs:
+            return
+
+        timestamp = now()
+        user = frappe.session.user
+        with self.metrics.stage("log_write", rows=len(logs)):
+            frappe.db.bulk_insert("Notification Log", NOTIFICATION_LOG_FIELDS, [
+                (
+                    frappe.generate_hash(length=10), customer.name, event_type, status, message,
+                    customer.loyalty_program, sms_segments, user, user, timestamp, timestamp, 0, 0
+                )
+                for customer, status, message, sms_segments in logs
+            ])
 
     def get_loyalty_tier_discount(self, customer, rule):
         customer_doc = frappe.get_doc("Customer", customer)
@@ -206,8 +380,9 @@ class NotificationManager:
                     
         return tier_discounts.get(current_tier)
 
-    def create_coupon(self, customer, notif_rule, pricing_rule_name):
-        """Create coupon based on notification rule"""
+    def create_coupon(self, customer, notif_rule, pricing_rule_name, valid_from=None):
+        """Create coupon based on notification rule, valid from today unless given"""
+        valid_from = valid_from or today()
         coupon_code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
         
         coupon = frappe.get_doc({
@@ -217,8 +392,8 @@ class NotificationManager:
             "coupon_type": "Gift Card",
             "pricing_rule": pricing_rule_name,
             "customer": customer.name,
-            "valid_from": today(),
-            "valid_upto": add_days(today(), notif_rule.validity_days)
+            "valid_from": valid_from,
+            "valid_upto": add_days(valid_from, notif_rule.validity_days)
         })
         coupon.insert(ignore_permissions=True)
         return coupon
@@ -230,52 +405,136 @@ class NotificationManager:
                 return rule
         return None
 
-    def log_notification(self, customer, event_type, status, message, coupon=None, loyalty_tier=None):
-        """Log notification details"""
-        frappe.get_doc({
-            "doctype": "Notification Log",
-            "customer": customer.name,
-            "event_type": event_type,
-            "status": status,
-            "message": message,
-            "loyalty_program": customer.loyalty_program,
-            "loyalty_tier": loyalty_tier,
-            "coupon": coupon
-        }).insert(ignore_permissions=True)
+    def render_sms(self, rule, message):
+        """Apply the rule's SMS encoding to a rendered message"""
+        if rule.sms_encoding == "GSM-7 Transliteration":
+            return to_gsm7(message)
+        return message
+
+    def log_notification(self, customer, event_type, status, message, coupon=None, loyalty_tier=None, sms_message=None, retryable=False, sms_segments=None):
+        """Log notification details; retryable failures are queued for redrive"""
+        if sms_segments is None and sms_message:
+            sms_segments = count_segments(sms_message).segments
+        if status == "Success" and sms_segments:
+            # Segments are what the gateway bills for
+            self.metrics.count("sms_segments", rows=sms_segments)
+
+        with self.metrics.stage("log_write"):
+            frappe.get_doc({
+                "doctype": "Notification Log",
+                "customer": customer.name,
+                "event_type": event_type,
+                "status": status,
+                "message": message,
+                "loyalty_program": customer.loyalty_program,
+                "loyalty_tier": loyalty_tier,
+                "coupon": coupon,
+                "sms_message": sms_message,
+                "sms_segments": sms_segments,
+                **(get_retry_fields(attempts=1) if retryable else {})
+            }).insert(ignore_permissions=True)
 
 def process_daily_notifications():
-    """Process all daily notifications"""
-    manager = NotificationManager()
+    """
+    Process all daily notifications and record a Notification Run.
+    Only the scheduler holding the lease runs it, once per day; it is
+    scheduled repeatedly so another worker takes over after a crash.
+    """
+    start = frappe.conf.notification_daily_start or DAILY_NOTIFICATIONS_START
+    if now_datetime().time() < get_time(start):
+        return
+
+    cache = frappe.cache()
+    done_key = cache.make_key(f"{DAILY_NOTIFICATIONS_DONE_KEY}::{today()}")
+    if cache.get(done_key):
+        return
+
+    with LeaseLock(DAILY_NOTIFICATIONS_LEASE, ttl=frappe.conf.notification_lease_ttl or 60) as lease:
+        if not lease.acquired:
+            return
+        # The previous holder may have finished while we waited
+        if cache.get(done_key):
+            return
+
+        metrics = RunMetrics("Daily Notifications")
+        try:
+            run_daily_notifications(metrics, lease)
+            lease.ensure_held()
+        except Exception:
+            # Batches are committed as the run goes, and each customer's
+            # writes sit in a released savepoint, so commit the customers
+            # handled since the last batch too: their SMS are out already.
+            # The rerun skips every customer logged today.
+            metrics.save("Failed", frappe.get_traceback())
+            frappe.db.commit()
+            raise
+
+        metrics.save()
+        frappe.db.commit()
+        cache.set(done_key, 1, ex=2 * 24 * 60 * 60)
+
+
+@profiled
+def run_daily_notifications(metrics, lease=None):
+    from notification_manager.notification_manager.schedule import dispatch_scheduled_notifications
+
+    manager = NotificationManager(metrics)
+    committer = BatchCommitter()
     
     
     # Process birthday notifs
     today_date = today()
     month_day = today_date[5:]  # Get MM-DD
 
-    birthday_customers = frappe.db.sql("""
-        SELECT name, customer_name, mobile_no, loyalty_program, loyalty_program_tier 
-        FROM `tabCustomer` 
-        WHERE DATE_FORMAT(custom_birthday, '%%m-%%d') = %s 
-        AND mobile_no != ''
-    """, month_day, as_dict=1)
-    
+    # Send what the nightly job already prepared; the queries below only
+    # pick up customers it did not cover (e.g. created since)
+    scheduled = dispatch_scheduled_notifications(manager, metrics, today_date, lease, committer)
+
+    # Customers an earlier, failed run handled already
+    logged = get_logged_today(["Birthday", "Membership Anniversary", "Loyalty Upgrade"])
+
+    with metrics.stage("birthday_query") as stage:
+        birthday_customers = frappe.db.sql("""
+            SELECT name, customer_name, mobile_no, loyalty_program, loyalty_program_tier
+            FROM `tabCustomer`
+            WHERE DATE_FORMAT(custom_birthday, '%%m-%%d') = %s
+            AND (custom_mobile_e164 IS NOT NULL OR mobile_no != '')
+        """, month_day, as_dict=1)
+        stage.rows += len(birthday_customers)
+
     for cust in birthday_customers:
-        customer = frappe.get_doc("Customer", cust.name)
-        manager.send_tier_notification(customer, "Birthday")
+        if cust.name in scheduled["Birthday"] or (cust.name, "Birthday") in logged:
+            continue
+        if lease:
+            lease.ensure_held()
+        with metrics.stage("customer_load"):
+            customer = frappe.get_doc("Customer", cust.name)
+        sent = manager.send_tier_notification(customer, "Birthday")
+        metrics.count("birthday_notifications", rows=1, success=int(sent), failed=int(not sent))
+        committer.add()
+
 
-    
     # Process membership anniversaries
-    member_customers = frappe.db.sql("""
-        SELECT name, customer_name, mobile_no, loyalty_program, loyalty_program_tier 
-        FROM `tabCustomer` 
-        WHERE DATE_FORMAT(custom_member_date, '%%m-%%d') = %s 
-        AND mobile_no != ''
-        and EXTRACT(YEAR FROM custom_member_date) != EXTRACT(YEAR FROM CURRENT_DATE)
-    """, month_day, as_dict=1)
-    
+    with metrics.stage("anniversary_query") as stage:
+        member_customers = frappe.db.sql("""
+            SELECT name, customer_name, mobile_no, loyalty_program, loyalty_program_tier
+            FROM `tabCustomer`
+            WHERE DATE_FORMAT(custom_member_date, '%%m-%%d') = %s
+            AND (custom_mobile_e164 IS NOT NULL OR mobile_no != '')
+            and EXTRACT(YEAR FROM custom_member_date) != EXTRACT(YEAR FROM CURRENT_DATE)
+        """, month_day, as_dict=1)
+        stage.rows += len(member_customers)
+
     for cust in member_customers:
-        customer = frappe.get_doc("Customer", cust.name)
-        manager.send_notification(customer, "Membership Anniversary")
+        if cust.name in scheduled["Membership Anniversary"] or (cust.name, "Membership Anniversary") in logged:
+            continue
+        if lease:
+            lease.ensure_held()
+        with metrics.stage("customer_load"):
+            customer = frappe.get_doc("Customer", cust.name)
+        sent = manager.send_notification(customer, "Membership Anniversary")
+        metrics.count("anniversary_notifications", rows=1, success=int(sent), failed=int(not sent))
+        committer.add()
         
     
     # """Process loyalty tier changes based on yesterday's purchases"""
@@ -283,71 +542,64 @@ def process_daily_notifications():
     day_before_yesterday = add_days(today(), -2)
 
     # Get customers who made purchases yesterday
-    tier_changes = frappe.db.sql("""
-        WITH CurrentTotals AS (
-            SELECT 
-                customer,
-                loyalty_program,
-                SUM(purchase_amount) as current_total
-            FROM `tabLoyalty Point Entry`
-            WHERE posting_date <= %s
-                AND expiry_date >= %s
-                AND loyalty_points > 0
-            GROUP BY customer, loyalty_program
-        ),
-        PreviousTotals AS (
-            SELECT 
-                customer,
-                loyalty_program,
-                SUM(purchase_amount) as previous_total
-            FROM `tabLoyalty Point Entry`
-            WHERE posting_date <= %s
-                AND expiry_date >= %s
-                AND loyalty_points > 0
-            GROUP BY customer, loyalty_program
-        )
-        SELECT 
-            c.customer,
-            c.loyalty_program,
-            COALESCE(p.previous_total, 0) as previous_total,
-            COALESCE(c.current_total, 0) as current_total,
-            cust.loyalty_program_tier as current_tier
-        FROM CurrentTotals c
-        LEFT JOIN PreviousTotals p 
-            ON c.customer = p.customer 
-            AND c.loyalty_program = p.loyalty_program
-        INNER JOIN `tabCustomer` cust 
-            ON c.customer = cust.name
-        WHERE EXISTS (
-            SELECT 1 
-            FROM `tabLoyalty Point Entry` lpe
-            WHERE lpe.customer = c.customer
-                AND lpe.posting_date = %s
-        )
-    """, (yesterday, yesterday, day_before_yesterday, day_before_yesterday, yesterday), as_dict=1)
-    
+    with metrics.stage("tier_query") as stage:
+        tier_changes = frappe.db.sql("""
+            WITH CurrentTotals AS (
+                SELECT
+                    customer,
+                    loyalty_program,
+                    SUM(purchase_amount) as current_total
+                FROM `tabLoyalty Point Entry`
+                WHERE posting_date <= %s
+                    AND expiry_date >= %s
+                    AND loyalty_points > 0
+                GROUP BY customer, loyalty_program
+            ),
+            PreviousTotals AS (
+                SELECT
+                    customer,
+                    loyalty_program,
+                    SUM(purchase_amount) as previous_total
+                FROM `tabLoyalty Point Entry`
+                WHERE posting_date <= %s
+                    AND expiry_date >= %s
+                    AND loyalty_points > 0
+                GROUP BY customer, loyalty_program
+            )
+            SELECT
+                c.customer,
+                c.loyalty_program,
+                COALESCE(p.previous_total, 0) as previous_total,
+                COALESCE(c.current_total, 0) as current_total,
+                cust.loyalty_program_tier as current_tier
+            FROM CurrentTotals c
+            LEFT JOIN PreviousTotals p
+                ON c.customer = p.customer
+                AND c.loyalty_program = p.loyalty_program
+            INNER JOIN `tabCustomer` cust
+                ON c.customer = cust.name
+            WHERE EXISTS (
+                SELECT 1
+                FROM `tabLoyalty Point Entry` lpe
+                WHERE lpe.customer = c.customer
+                    AND lpe.posting_date = %s
+            )
+        """, (yesterday, yesterday, day_before_yesterday, day_before_yesterday, yesterday), as_dict=1)
+        stage.rows += len(tier_changes)
+
     loyalty_program = frappe.get_doc("Loyalty Program", "LAC CLUB")
     tier_changed = False
 
-    for change in tier_changes:
-        customer = frappe.get_doc("Customer", change.customer)
-        
-        # Get tier levels sorted by min_spent
-        tier_levels = sorted(
-            [d.as_dict() for d in loyalty_program.collection_rules],
-            key=lambda rule: rule.min_spent
-        )
+    # Get tier levels sorted by min_spent
+    tiers = get_program_tiers(loyalty_program)
 
-        # Determine previous and new tiers
-        def get_tier(total_spent):
-            for tier in tier_levels:
-                if total_spent <= tier.min_spent:
-                    return tier.tier_name
-            return "Classic"
+    # Determine previous and new tiers for all customers at once
+    previous_tiers = classify_tiers([change.previous_total for change in tier_changes], tiers)
+    new_tiers = classify_tiers([change.current_total for change in tier_changes], tiers)
 
-        previous_tier = get_tier(change.previous_total)
-        new_tier = get_tier(change.current_total)
-        
+    for change, previous_tier, new_tier in zip(tier_changes, previous_tiers, new_tiers, strict=True):
+        if lease:
+            lease.ensure_held()
         # If tier is classic then continue
         if new_tier in ('Classic 1', 'Classic 2'):
             continue
@@ -355,11 +607,17 @@ def process_daily_notifications():
         # If tier has changed, send notification
         if new_tier != previous_tier:
             tier_changed = True
+            if (change.customer, "Loyalty Upgrade") in logged:
+                continue
+            with metrics.stage("customer_load"):
+                customer = frappe.get_doc("Customer", change.customer)
             customer.loyalty_program_tier = new_tier
-            manager.send_tier_notification(customer, "Loyalty Upgrade")
+            sent = manager.send_tier_notification(customer, "Loyalty Upgrade")
+            metrics.count("tier_notifications", rows=1, success=int(sent), failed=int(not sent))
             
             # Log the change
             manager.log_notification(customer, "Tier_Change", "Success", f"Tier changed from {previous_tier} to {new_tier}")
+            committer.add()
     
     if not tier_changed:
         frappe.get_doc({
@@ -371,7 +629,60 @@ def process_daily_notifications():
         }).insert(ignore_permissions=True)
     
 
+def get_logged_today(event_types):
+    """(customer, event_type) of every Notification Log written today"""
+    return set(frappe.db.sql("""
+        SELECT customer, event_type
+        FROM `tabNotification Log`
+        WHERE creation >= %s AND event_type IN %s
+    """, (today(), event_types)))
+
+
 def on_customer_create(doc, method):
     """Handle new customer registration"""
+    if frappe.flags.in_import:
+        # Welcomed in bulk by send_import_welcome_notifications
+        queue_import_welcome(doc.name)
+        return
+
     manager = NotificationManager()
-    manager.send_notification(doc, "New Registration")
\ No newline at end of file
+    manager.send_notification(doc, "New Registration")
+
+
+def queue_import_welcome(customer_name):
+    cache = frappe.cache()
+    cache.rpush(IMPORT_WELCOME_QUEUE_KEY, customer_name)
+    cache.set(cache.make_key(IMPORT_WELCOME_LAST_KEY), time.time())
+
+
+def send_import_welcome_notifications():
+    """
+    Welcome customers queued during a Data Import (scheduled every minute).
+    Waits until the import has been quiet for
+    notification_import_quiet_seconds, then sends in chunks. A chunk
+    leaves the queue only once its logs are committed, so one that fails
+    is sent again on the next run.
+    """
+    cache = frappe.cache()
+    if not cache.llen(IMPORT_WELCOME_QUEUE_KEY):
+        return
+
+    last_queued = float(cache.get(cache.make_key(IMPORT_WELCOME_LAST_KEY)) or 0)
+    if time.time() - last_queued < (frappe.conf.notification_import_quiet_seconds or IMPORT_QUIET_SECONDS):
+        return
+
+    metrics = RunMetrics("Import Welcome")
+    manager = NotificationManager(metrics)
+    while True:
+        names = cache.lrange(IMPORT_WELCOME_QUEUE_KEY, 0, SMS_RECEIVER_CHUNK - 1)
+        if not names:
+            break
+
+        sent = manager.send_bulk_notification([frappe.safe_decode(name) for name in names], "New Registration")
+        metrics.count("welcome_notifications", rows=len(names), success=sent, failed=len(names) - sent)
+        frappe.db.commit()
+        # Names are only appended, so the head is still this chunk
+        cache.ltrim(IMPORT_WELCOME_QUEUE_KEY, len(names), -1)
+
+    metrics.save()
+    frappe.db.commit()
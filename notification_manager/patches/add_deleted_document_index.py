@@ -0,0 +1,7 @@
+import frappe
+
+
+def execute():
+    # get_item_changes keyset-pages deleted Items and Bins by
+    # (creation, name) within their deleted_doctype
+    frappe.db.add_index("Deleted Document", ["deleted_doctype", "creation"], index_name="deleted_doctype_creation")
@@ -0,0 +1,9 @@
+import frappe
+
+
+def execute():
+    # get_item_changes keyset-pages Item and Bin by (modified, name);
+    # InnoDB appends the primary key, so an index on modified is enough.
+    # Named like Frappe's own index so this is a no-op where it exists.
+    for doctype in ("Item", "Bin"):
+        frappe.db.add_index(doctype, ["modified"], index_name="modified")
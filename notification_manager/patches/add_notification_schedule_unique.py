@@ -0,0 +1,11 @@
+import frappe
+
+
+def execute():
+    # One calendar entry per customer, event and day; the nightly job
+    # relies on it to stay idempotent when it runs twice
+    frappe.db.add_unique(
+        "Notification Schedule",
+        ["customer", "event_type", "scheduled_date"],
+        constraint_name="customer_event_date"
+    )
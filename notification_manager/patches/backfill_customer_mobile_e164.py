@@ -0,0 +1,39 @@
+import frappe
+
+from notification_manager.notification_manager.customer import normalize_mobile
+
+CHUNK_SIZE = 1000
+
+
+def execute():
+    # Keyset-walk Customer and fill custom_mobile_e164 with one CASE
+    # UPDATE per chunk
+    last_name = ""
+
+    while True:
+        rows = frappe.db.sql("""
+            SELECT name, mobile_no, phone
+            FROM `tabCustomer`
+            WHERE name > %s
+            ORDER BY name
+            LIMIT %s
+        """, (last_name, CHUNK_SIZE), as_dict=True)
+        if not rows:
+            break
+        last_name = rows[-1].name
+
+        updates = {}
+        for row in rows:
+            normalized = normalize_mobile(row.mobile_no or row.phone)
+            if normalized:
+                updates[row.name] = normalized
+
+        if updates:
+            cases = " ".join(["WHEN %s THEN %s"] * len(updates))
+            values = [value for pair in updates.items() for value in pair]
+            frappe.db.sql(f"""
+                UPDATE `tabCustomer`
+                SET custom_mobile_e164 = CASE name {cases} END
+                WHERE name IN %s
+            """, (*values, list(updates)))
+            frappe.db.commit()
@@ -0,0 +1,5 @@
+from notification_manager.notification_manager.customer import create_customer_fields
+
+
+def execute():
+    create_customer_fields()
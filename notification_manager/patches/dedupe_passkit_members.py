@@ -0,0 +1,22 @@
+import frappe
+
+
+def execute():
+    # customer_name and passkit_id become unique when the doctype is
+    # synced, which fails on duplicate rows. Keep the most recently
+    # modified row of each customer / PassKit id and drop the others.
+    if not frappe.db.table_exists("Passkit Member"):
+        return
+
+    # Unique Data fields store empty values as NULL, which may repeat
+    frappe.db.sql("UPDATE `tabPasskit Member` SET passkit_id = NULL WHERE passkit_id = ''")
+
+    for field in ("customer_name", "passkit_id"):
+        frappe.db.sql(f"""
+            DELETE older
+            FROM `tabPasskit Member` older
+            JOIN `tabPasskit Member` newer
+                ON newer.`{field}` = older.`{field}`
+                AND (newer.modified > older.modified
+                    OR (newer.modified = older.modified AND newer.name > older.name))
+        """)